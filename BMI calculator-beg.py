@@ -1,19 +1,33 @@
-print("==--Panfar Simple MBI Calculator--==")
-
-weight = float(input("Enter your weight in kg: "))
-height = float(input("Enter your height in cm: "))
-
-height =  height/100 
-bmi= weight/height**2
-print("your bmi (body mass index) is: " , round(bmi, 2))
-
-if bmi < 18.5:
-    print("oops , You are underweight. -- you need to eat more neutrients food ")
-elif 18.5<= bmi < 25:
-    print("yeeeeeeee , you are Normal.  -- good keep it up ")
-elif 25<= bmi <30 :
-    print("cheeee , you are overweight. -- do exersize ")
-else :
-    print("OMG , you are obese.  -- go to doctor and concern upon it.")
-     
-           
\ No newline at end of file
+import sys
+
+from bmi_core import SCHEME, calculate_bmi
+
+# One message per category, in bmi_core.CATEGORY_NAMES order
+MESSAGES = (
+    "oops , You are underweight. -- you need to eat more neutrients food ",
+    "yeeeeeeee , you are Normal.  -- good keep it up ",
+    "cheeee , you are overweight. -- do exersize ",
+    "OMG , you are obese.  -- go to doctor and concern upon it.",
+)
+
+
+def interactive():
+    print("==--Panfar Simple MBI Calculator--==")
+
+    weight = float(input("Enter your weight in kg: "))
+    height = float(input("Enter your height in cm: "))
+
+    bmi = calculate_bmi(weight, height)
+    print("your bmi (body mass index) is: " , round(bmi, 2))
+
+    # Cutoffs follow BMI_SCHEME, like the rest of bmi_core
+    print(MESSAGES[SCHEME.code(bmi)])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Batch mode: python "BMI calculator-beg.py" measurements.csv > scored.csv
+        # (- reads stdin); python -m bmi_core.score --help lists the options
+        from bmi_core.score import main
+        sys.exit(main())
+    interactive()
\ No newline at end of file
@@ -1,516 +1,856 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import json
-import os
-from datetime import datetime
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-
-class BMICalculator:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("PANFAR BMI Calculator")
-        self.root.geometry("900x700")
-        self.root.resizable(False, False)
-        
-        
-        self.data_file = "bmi_data.json"
-        self.users_data = self.load_data()
-        
-        self.bg_color = "#b6f3b4"
-        self.primary_color = "#D01212"
-        self.secondary_color = "#E161B2"
-        
-        self.root.configure(bg=self.bg_color)
-        
-        self.notebook = ttk.Notebook(root)
-        self.notebook.pack(fill='both', expand=True, padx=10, pady=10 )
-        
-        self.calculator_tab = ttk.Frame(self.notebook)
-        self.history_tab = ttk.Frame(self.notebook)
-        self.statistics_tab = ttk.Frame(self.notebook)
-        
-        self.notebook.add(self.calculator_tab, text="BMI Calculator")
-        self.notebook.add(self.history_tab, text="History")
-        self.notebook.add(self.statistics_tab, text="Statistics & Trends")
-        
-        self.setup_calculator_tab()
-        self.setup_history_tab()
-        self.setup_statistics_tab()
-        
-    def load_data(self):
-        """Load user data from JSON file"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-    
-    def save_data(self):
-        """Save user data to JSON file"""
-        try:
-            with open(self.data_file, 'w') as f:
-                json.dump(self.users_data, f, indent=4)
-            return True
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save data: {str(e)}")
-            return False
-    
-    def calculate_bmi(self, weight, height):
-        """Calculate BMI from weight (kg) and height (cm)"""
-        height_m = height / 100
-        return weight / (height_m ** 2)
-    
-    def categorize_bmi(self, bmi):
-        """Categorize BMI value"""
-        if bmi < 18.5:
-            return "Underweight", "#3498db"
-        elif 18.5 <= bmi < 25:
-            return "Normal weight", "#193ab1"
-        elif 25 <= bmi < 30:
-            return "Overweight", "#f39c12"
-        else:
-            return "Obese", "#e74c3c"
-    
-    def setup_calculator_tab(self):
-        """Setup the BMI calculator interface"""
-        
-        main_frame = tk.Frame(self.calculator_tab, bg=self.bg_color)
-        main_frame.pack(fill='both', expand=True, padx=20, pady=20)
-        
-       
-        title = tk.Label(main_frame, text="PANFAR's BMI Calculator", 
-                        font=("Arial", 24, "bold"), bg=self.bg_color, fg="#333")
-        title.pack(pady=10)
-        
-        
-        input_frame = tk.LabelFrame(main_frame, text="User Information", 
-                                   font=("Arial", 12, "bold"), bg=self.bg_color, 
-                                   padx=20, pady=20)
-        input_frame.pack(pady=10, fill='x')
-        
-        tk.Label(input_frame, text="Username:", font=("Arial", 11), 
-                bg=self.bg_color).grid(row=0, column=0, sticky='w', pady=5)
-        self.username_var = tk.StringVar()
-        username_entry = ttk.Entry(input_frame, textvariable=self.username_var, 
-                                   font=("Arial", 11), width=25)
-        username_entry.grid(row=0, column=1, padx=10, pady=5)
-        
-        
-        tk.Label(input_frame, text="Weight (kg):", font=("Arial", 11), 
-                bg=self.bg_color).grid(row=1, column=0, sticky='w', pady=5)
-        self.weight_var = tk.StringVar()
-        weight_entry = ttk.Entry(input_frame, textvariable=self.weight_var, 
-                                font=("Arial", 11), width=25)
-        weight_entry.grid(row=1, column=1, padx=10, pady=5)
-        
-        
-        tk.Label(input_frame, text="Height (cm):", font=("Arial", 11), 
-                bg=self.bg_color).grid(row=2, column=0, sticky='w', pady=5)
-        self.height_var = tk.StringVar()
-        height_entry = ttk.Entry(input_frame, textvariable=self.height_var, 
-                                font=("Arial", 11), width=25)
-        height_entry.grid(row=2, column=1, padx=10, pady=5)
-        
-        
-        calc_btn = tk.Button(main_frame, text="Calculate BMI", 
-                            command=self.calculate_and_save,
-                            font=("Arial", 12, "bold"), bg=self.primary_color, 
-                            fg="white", padx=20, pady=10, cursor="hand2")
-        calc_btn.pack(pady=15)
-        
-       
-        self.result_frame = tk.LabelFrame(main_frame, text="Results", 
-                                         font=("Arial", 12, "bold"), 
-                                         bg=self.bg_color, padx=20, pady=20)
-        self.result_frame.pack(pady=10, fill='both', expand=True)
-        
-        self.result_label = tk.Label(self.result_frame, text="", 
-                                     font=("Arial", 14), bg=self.bg_color, 
-                                     wraplength=600)
-        self.result_label.pack()
-        
-       
-        ref_frame = tk.LabelFrame(main_frame, text="BMI Reference", 
-                                 font=("Arial", 10, "bold"), bg=self.bg_color)
-        ref_frame.pack(pady=5, fill='x')
-        
-        references = [
-            ("Underweight", "< 18.5", "#3498db"),
-            ("Normal", "18.5 - 24.9", "#2ecc71"),
-            ("Overweight", "25 - 29.9", "#f39c12"),
-            ("Obese", "≥ 30", "#e74c3c")
-        ]
-        
-        for i, (cat, range_val, color) in enumerate(references):
-            frame = tk.Frame(ref_frame, bg=self.bg_color)
-            frame.pack(side='left', expand=True, padx=5, pady=5)
-            tk.Label(frame, text="●", fg=color, font=("Arial", 16), 
-                    bg=self.bg_color).pack(side='left')
-            tk.Label(frame, text=f"{cat}: {range_val}", font=("Arial", 9), 
-                    bg=self.bg_color).pack(side='left', padx=5)
-    
-    def validate_input(self, username, weight, height):
-        """Validate user inputs"""
-        if not username.strip():
-            messagebox.showerror("Error", "Please enter a username")
-            return False
-        
-        try:
-            weight = float(weight)
-            if weight <= 0 or weight > 500:
-                messagebox.showerror("Error", "Weight must be between 0 and 500 kg")
-                return False
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid weight")
-            return False
-        
-        try:
-            height = float(height)
-            if height <= 0 or height > 300:
-                messagebox.showerror("Error", "Height must be between 0 and 300 cm")
-                return False
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid height")
-            return False
-        
-        return True
-    
-    def calculate_and_save(self):
-        """Calculate BMI and save to history"""
-        username = self.username_var.get()
-        weight = self.weight_var.get()
-        height = self.height_var.get()
-        
-        if not self.validate_input(username, weight, height):
-            return
-        
-        weight = float(weight)
-        height = float(height)
-        
-        
-        bmi = self.calculate_bmi(weight, height)
-        category, color = self.categorize_bmi(bmi)
-        
-        
-        result_text = f"BMI: {bmi:.2f}\n\nCategory: {category}\n\n"
-        
-        if category == "Underweight":
-            result_text += "You may need to gain weight. Consult a healthcare provider."
-        elif category == "Normal weight":
-            result_text += "Great! You're at a healthy weight. Keep it up!"
-        elif category == "Overweight":
-            result_text += "Consider a balanced diet and regular exercise."
-        else:
-            result_text += "Please consult a healthcare provider for guidance."
-        
-        self.result_label.config(text=result_text, fg=color)
-        
-       
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        if username not in self.users_data:
-            self.users_data[username] = []
-        
-        self.users_data[username].append({
-            "date": timestamp,
-            "weight": weight,
-            "height": height,
-            "bmi": round(bmi, 2),
-            "category": category
-        })
-        
-        if self.save_data():
-            messagebox.showinfo("Success", "BMI calculated and saved successfully!")
-            self.refresh_history()
-            self.refresh_statistics()
-    
-    def setup_history_tab(self):
-        """Setup the history viewing interface"""
-        main_frame = tk.Frame(self.history_tab, bg=self.bg_color)
-        main_frame.pack(fill='both', expand=True, padx=20, pady=20)
-        
-        
-        tk.Label(main_frame, text="BMI History", font=("Arial", 20, "bold"), 
-                bg=self.bg_color).pack(pady=10)
-        
-       
-        select_frame = tk.Frame(main_frame, bg=self.bg_color)
-        select_frame.pack(pady=10)
-        
-        tk.Label(select_frame, text="Select User:", font=("Arial", 11), 
-                bg=self.bg_color).pack(side='left', padx=5)
-        
-        self.history_user_var = tk.StringVar()
-        self.history_user_combo = ttk.Combobox(select_frame, 
-                                               textvariable=self.history_user_var,
-                                               font=("Arial", 11), width=20, 
-                                               state='readonly')
-        self.history_user_combo.pack(side='left', padx=5)
-        self.history_user_combo.bind('<<ComboboxSelected>>', 
-                                     lambda e: self.display_user_history())
-        
-       
-        tree_frame = tk.Frame(main_frame)
-        tree_frame.pack(fill='both', expand=True, pady=10)
-        
-       
-        scrollbar = ttk.Scrollbar(tree_frame)
-        scrollbar.pack(side='right', fill='y')
-        
-       
-        self.history_tree = ttk.Treeview(tree_frame, 
-                                         columns=('Date', 'Weight', 'Height', 'BMI', 'Category'),
-                                         show='headings', yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.history_tree.yview)
-        
-      
-        self.history_tree.heading('Date', text='Date & Time')
-        self.history_tree.heading('Weight', text='Weight (kg)')
-        self.history_tree.heading('Height', text='Height (cm)')
-        self.history_tree.heading('BMI', text='BMI')
-        self.history_tree.heading('Category', text='Category')
-        
-        self.history_tree.column('Date', width=150)
-        self.history_tree.column('Weight', width=100)
-        self.history_tree.column('Height', width=100)
-        self.history_tree.column('BMI', width=80)
-        self.history_tree.column('Category', width=120)
-        
-        self.history_tree.pack(fill='both', expand=True)
-        
-        
-        btn_frame = tk.Frame(main_frame, bg=self.bg_color)
-        btn_frame.pack(pady=10)
-        
-        tk.Button(btn_frame, text="Delete Selected Entry", 
-                 command=self.delete_entry, font=("Arial", 10),
-                 bg="#e74c3c", fg="white", padx=10, pady=5).pack(side='left', padx=5)
-        
-        tk.Button(btn_frame, text="Clear All History for User", 
-                 command=self.clear_user_history, font=("Arial", 10),
-                 bg="#e67e22", fg="white", padx=10, pady=5).pack(side='left', padx=5)
-        
-        self.refresh_history()
-    
-    def refresh_history(self):
-        """Refresh the history dropdown"""
-        users = list(self.users_data.keys())
-        self.history_user_combo['values'] = users
-        if users:
-            if not self.history_user_var.get() or self.history_user_var.get() not in users:
-                self.history_user_var.set(users[0])
-            self.display_user_history()
-    
-    def display_user_history(self):
-        """Display history for selected user"""
-        
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-        
-        username = self.history_user_var.get()
-        if username and username in self.users_data:
-            history = self.users_data[username]
-            
-            if isinstance(history, list):
-                for entry in reversed(history):
-                    if isinstance(entry, dict):
-                        self.history_tree.insert('', 'end', values=(
-                            entry.get('date', 'N/A'),
-                            entry.get('weight', 'N/A'),
-                            entry.get('height', 'N/A'),
-                            entry.get('bmi', 'N/A'),
-                            entry.get('category', 'N/A')
-                        ))
-    
-    def delete_entry(self):
-        """Delete selected history entry"""
-        selected = self.history_tree.selection()
-        if not selected:
-            messagebox.showwarning("Warning", "Please select an entry to delete")
-            return
-        
-        if messagebox.askyesno("Confirm", "Delete selected entry?"):
-            item = self.history_tree.item(selected[0])
-            date = item['values'][0]
-            username = self.history_user_var.get()
-            
-            self.users_data[username] = [e for e in self.users_data[username] 
-                                         if e['date'] != date]
-            
-            if self.save_data():
-                self.display_user_history()
-                self.refresh_statistics()
-                messagebox.showinfo("Success", "Entry deleted successfully")
-    
-    def clear_user_history(self):
-        """Clear all history for selected user"""
-        username = self.history_user_var.get()
-        if not username:
-            return
-        
-        if messagebox.askyesno("Confirm", 
-                              f"Delete all history for {username}?"):
-            del self.users_data[username]
-            if self.save_data():
-                self.refresh_history()
-                self.refresh_statistics()
-                messagebox.showinfo("Success", "History cleared successfully")
-    
-    def setup_statistics_tab(self):
-        """Setup the statistics and trends interface"""
-        main_frame = tk.Frame(self.statistics_tab, bg=self.bg_color)
-        main_frame.pack(fill='both', expand=True, padx=20, pady=20)
-        
-       
-        tk.Label(main_frame, text="Statistics & Trends", 
-                font=("Arial", 20, "bold"), bg=self.bg_color).pack(pady=10)
-        
-       
-        select_frame = tk.Frame(main_frame, bg=self.bg_color)
-        select_frame.pack(pady=10)
-        
-        tk.Label(select_frame, text="Select User:", font=("Arial", 11), 
-                bg=self.bg_color).pack(side='left', padx=5)
-        
-        self.stats_user_var = tk.StringVar()
-        self.stats_user_combo = ttk.Combobox(select_frame, 
-                                            textvariable=self.stats_user_var,
-                                            font=("Arial", 11), width=20, 
-                                            state='readonly')
-        self.stats_user_combo.pack(side='left', padx=5)
-        self.stats_user_combo.bind('<<ComboboxSelected>>', 
-                                   lambda e: self.display_statistics())
-        
-       
-        self.stats_info_frame = tk.LabelFrame(main_frame, text="Summary Statistics",
-                                             font=("Arial", 11, "bold"), 
-                                             bg=self.bg_color, padx=20, pady=20)
-        self.stats_info_frame.pack(pady=10, fill='x')
-        
-        self.stats_label = tk.Label(self.stats_info_frame, text="", 
-                                    font=("Arial", 10), bg=self.bg_color, 
-                                    justify='left')
-        self.stats_label.pack()
-        
-        
-        self.chart_frame = tk.Frame(main_frame, bg='#bbc3ee')
-        self.chart_frame.pack(fill='both', expand=True, pady=10)
-        
-        self.refresh_statistics()
-    
-    def refresh_statistics(self):
-        """Refresh the statistics dropdown"""
-        users = list(self.users_data.keys())
-        self.stats_user_combo['values'] = users
-        if users:
-            if not self.stats_user_var.get() or self.stats_user_var.get() not in users:
-                self.stats_user_var.set(users[0])
-            self.display_statistics()
-    
-    def display_statistics(self):
-        """Display statistics and trends for selected user"""
-        username = self.stats_user_var.get()
-        
-        if not username or username not in self.users_data:
-            self.stats_label.config(text="No data available")
-          
-            for widget in self.chart_frame.winfo_children():
-                widget.destroy()
-            return
-        
-        data = self.users_data[username]
-        
-       
-        if not isinstance(data, list) or not data:
-            self.stats_label.config(text="No data available")
-            
-            for widget in self.chart_frame.winfo_children():
-                widget.destroy()
-            return
-        
-       
-        bmis = [entry['bmi'] for entry in data if isinstance(entry, dict) and 'bmi' in entry]
-        weights = [entry['weight'] for entry in data if isinstance(entry, dict) and 'weight' in entry]
-        
-        if not bmis or not weights:
-            self.stats_label.config(text="No valid data available")
-            
-            for widget in self.chart_frame.winfo_children():
-                widget.destroy()
-            return
-        
-        avg_bmi = sum(bmis) / len(bmis)
-        min_bmi = min(bmis)
-        max_bmi = max(bmis)
-        latest_bmi = bmis[-1]
-        
-        avg_weight = sum(weights) / len(weights)
-        weight_change = weights[-1] - weights[0] if len(weights) > 1 else 0
-        
-       
-        stats_text = f"""
-Total Entries: {len(data)}
-Latest BMI: {latest_bmi:.2f}
-Average BMI: {avg_bmi:.2f}
-Lowest BMI: {min_bmi:.2f}
-Highest BMI: {max_bmi:.2f}
-
-Average Weight: {avg_weight:.2f} kg
-Weight Change: {weight_change:+.2f} kg
-        """
-        
-        self.stats_label.config(text=stats_text)
-        
-        
-        self.create_trend_chart(data)
-    
-    def create_trend_chart(self, data):
-        """Create BMI trend chart"""
-        
-        for widget in self.chart_frame.winfo_children():
-            widget.destroy()
-        
-        if len(data) < 2:
-            tk.Label(self.chart_frame, text="Need at least 2 entries to show trends",
-                    font=("Arial", 12), bg='#bbc3ee').pack(expand=True)
-            return
-        
-        
-        fig = Figure(figsize=(8, 4), dpi=100)
-        ax = fig.add_subplot(111)
-        
-        
-        dates = [entry['date'].split()[0] for entry in data]
-        bmis = [entry['bmi'] for entry in data]
-        
-        
-        ax.plot(dates, bmis, marker='o', linewidth=2, markersize=8, 
-               color=self.secondary_color)
-        ax.axhline(y=18.5, color='#3498db', linestyle='--', alpha=0.5, label='Underweight')
-        ax.axhline(y=25, color='#2ecc71', linestyle='--', alpha=0.5, label='Normal')
-        ax.axhline(y=30, color='#f39c12', linestyle='--', alpha=0.5, label='Overweight')
-        
-        ax.set_xlabel('Date', fontsize=10)
-        ax.set_ylabel('BMI', fontsize=10)
-        ax.set_title('BMI Trend Over Time', fontsize=12, fontweight='bold')
-        ax.grid(True, alpha=0.3)
-        ax.legend(loc='best', fontsize=8)
-        
-      
-        plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
-        
-        fig.tight_layout()
-        
-       
-        canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill='both', expand=True)
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = BMICalculator(root)
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import bmi_core
+from bmi_core import cohort, instrument, open_store, rollups
+from bmi_core.instrument import timed
+from bmi_core.worker import BackgroundWorker, LockedStore
+
+class BMICalculator:
+    HISTORY_PAGE_SIZE = 200
+    CHART_CACHE_SIZE = 32
+    WORKER_POLL_MS = 50
+    SYNC_MS = 2000
+    
+    def __init__(self, root):
+        self.root = root
+        self.root.title("PANFAR BMI Calculator")
+        self.root.geometry("900x700")
+        self.root.resizable(False, False)
+        
+        
+        self.data_file = "bmi_data.json"
+        self.store = LockedStore(open_store(self.data_file))
+        self.load_data()
+        
+        # Saves and statistics run off the Tk thread; results come back via poll_worker
+        self.worker = BackgroundWorker(self.store)
+        self.stats_request = 0
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(self.WORKER_POLL_MS, self.poll_worker)
+        # A shared store picks up other instances' changes on a timer
+        if getattr(self.store, 'sync', None) is not None:
+            self.root.after(self.SYNC_MS, self.poll_sync)
+        
+        self.bg_color = "#b6f3b4"
+        self.primary_color = "#D01212"
+        self.secondary_color = "#E161B2"
+        
+        self.root.configure(bg=self.bg_color)
+        
+        self.notebook = ttk.Notebook(root)
+        self.notebook.pack(fill='both', expand=True, padx=10, pady=10 )
+        
+        self.calculator_tab = ttk.Frame(self.notebook)
+        self.history_tab = ttk.Frame(self.notebook)
+        self.statistics_tab = ttk.Frame(self.notebook)
+        self.cohort_tab = ttk.Frame(self.notebook)
+        self.diagnostics_tab = ttk.Frame(self.notebook)
+        
+        self.notebook.add(self.calculator_tab, text="BMI Calculator")
+        self.notebook.add(self.history_tab, text="History")
+        self.notebook.add(self.statistics_tab, text="Statistics & Trends")
+        self.notebook.add(self.cohort_tab, text="Cohort")
+        self.notebook.add(self.diagnostics_tab, text="Diagnostics")
+        self.notebook.bind('<<NotebookTabChanged>>', lambda e: self.on_tab_changed())
+        
+        # The trend chart (and matplotlib) is only loaded once the tab is shown
+        self.chart_pending = False
+        
+        self.setup_calculator_tab()
+        self.setup_history_tab()
+        self.setup_statistics_tab()
+        self.setup_cohort_tab()
+        self.setup_diagnostics_tab()
+        
+    @timed("gui.load_data")
+    def load_data(self):
+        """Open the store and load user data"""
+        try:
+            self.store.load()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load data: {str(e)}")
+    
+    def save_data(self, on_saved=None):
+        """Persist pending changes on the writer thread, then call on_saved"""
+        def saved(result, error):
+            if error is not None:
+                messagebox.showerror("Error", f"Failed to save data: {str(error)}")
+                return
+            # The commit may have folded in other instances' changes
+            self.sync_store()
+            if on_saved is not None:
+                on_saved()
+        self.worker.save(saved)
+    
+    def poll_worker(self):
+        """Run callbacks for background work that has finished"""
+        self.worker.run_callbacks()
+        self.root.after(self.WORKER_POLL_MS, self.poll_worker)
+    
+    def poll_sync(self):
+        """Pick up other instances' changes every SYNC_MS"""
+        self.sync_store()
+        self.root.after(self.SYNC_MS, self.poll_sync)
+    
+    def sync_store(self):
+        """Fold in other instances' changes off the Tk thread, then redraw what they touched"""
+        sync = getattr(self.store, 'sync', None)
+        if sync is not None:
+            self.worker.submit(sync, self.show_synced)
+    
+    def show_synced(self, changed, error):
+        """Redraw the history and statistics of users other instances changed"""
+        if error is not None or not changed:
+            return
+        # History pages are fetched by position, so a history that changed underneath is rebuilt
+        if self.history_user_var.get() in changed:
+            self.display_user_history()
+        self.refresh_history()
+        self.refresh_statistics()
+    
+    def on_close(self):
+        """Wait for pending saves before closing the window"""
+        self.worker.close()
+        self.store.close()
+        self.root.destroy()
+    
+    def calculate_bmi(self, weight, height):
+        """Calculate BMI from weight (kg) and height (cm)"""
+        return bmi_core.calculate_bmi(weight, height)
+    
+    def categorize_bmi(self, bmi):
+        """Categorize BMI value"""
+        return bmi_core.categorize_bmi(bmi)
+    
+    def setup_calculator_tab(self):
+        """Setup the BMI calculator interface"""
+        
+        main_frame = tk.Frame(self.calculator_tab, bg=self.bg_color)
+        main_frame.pack(fill='both', expand=True, padx=20, pady=20)
+        
+       
+        title = tk.Label(main_frame, text="PANFAR's BMI Calculator", 
+                        font=("Arial", 24, "bold"), bg=self.bg_color, fg="#333")
+        title.pack(pady=10)
+        
+        
+        input_frame = tk.LabelFrame(main_frame, text="User Information", 
+                                   font=("Arial", 12, "bold"), bg=self.bg_color, 
+                                   padx=20, pady=20)
+        input_frame.pack(pady=10, fill='x')
+        
+        tk.Label(input_frame, text="Username:", font=("Arial", 11), 
+                bg=self.bg_color).grid(row=0, column=0, sticky='w', pady=5)
+        self.username_var = tk.StringVar()
+        username_entry = ttk.Entry(input_frame, textvariable=self.username_var, 
+                                   font=("Arial", 11), width=25)
+        username_entry.grid(row=0, column=1, padx=10, pady=5)
+        
+        
+        tk.Label(input_frame, text="Weight (kg):", font=("Arial", 11), 
+                bg=self.bg_color).grid(row=1, column=0, sticky='w', pady=5)
+        self.weight_var = tk.StringVar()
+        weight_entry = ttk.Entry(input_frame, textvariable=self.weight_var, 
+                                font=("Arial", 11), width=25)
+        weight_entry.grid(row=1, column=1, padx=10, pady=5)
+        
+        
+        tk.Label(input_frame, text="Height (cm):", font=("Arial", 11), 
+                bg=self.bg_color).grid(row=2, column=0, sticky='w', pady=5)
+        self.height_var = tk.StringVar()
+        height_entry = ttk.Entry(input_frame, textvariable=self.height_var, 
+                                font=("Arial", 11), width=25)
+        height_entry.grid(row=2, column=1, padx=10, pady=5)
+        
+        
+        calc_btn = tk.Button(main_frame, text="Calculate BMI", 
+                            command=self.calculate_and_save,
+                            font=("Arial", 12, "bold"), bg=self.primary_color, 
+                            fg="white", padx=20, pady=10, cursor="hand2")
+        calc_btn.pack(pady=15)
+        
+       
+        self.result_frame = tk.LabelFrame(main_frame, text="Results", 
+                                         font=("Arial", 12, "bold"), 
+                                         bg=self.bg_color, padx=20, pady=20)
+        self.result_frame.pack(pady=10, fill='both', expand=True)
+        
+        self.result_label = tk.Label(self.result_frame, text="", 
+                                     font=("Arial", 14), bg=self.bg_color, 
+                                     wraplength=600)
+        self.result_label.pack()
+        
+       
+        ref_frame = tk.LabelFrame(main_frame, text=f"BMI Reference ({bmi_core.SCHEME.title})", 
+                                 font=("Arial", 10, "bold"), bg=self.bg_color)
+        ref_frame.pack(pady=5, fill='x')
+        
+        for i, (cat, range_val, color) in enumerate(bmi_core.SCHEME.references()):
+            frame = tk.Frame(ref_frame, bg=self.bg_color)
+            frame.pack(side='left', expand=True, padx=5, pady=5)
+            tk.Label(frame, text="●", fg=color, font=("Arial", 16), 
+                    bg=self.bg_color).pack(side='left')
+            tk.Label(frame, text=f"{cat}: {range_val}", font=("Arial", 9), 
+                    bg=self.bg_color).pack(side='left', padx=5)
+    
+    def validate_input(self, username, weight, height):
+        """Validate user inputs"""
+        try:
+            bmi_core.validate_measurement(username, weight, height)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return False
+        
+        return True
+    
+    @timed("gui.calculate_and_save")
+    def calculate_and_save(self):
+        """Calculate BMI and save to history"""
+        username = self.username_var.get()
+        weight = self.weight_var.get()
+        height = self.height_var.get()
+        
+        if not self.validate_input(username, weight, height):
+            return
+        
+        weight = float(weight)
+        height = float(height)
+        
+        
+        bmi = self.calculate_bmi(weight, height)
+        category, color = self.categorize_bmi(bmi)
+        
+        
+        result_text = bmi_core.format_result(bmi)
+        self.result_label.config(text=result_text, fg=color)
+        
+       
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        entry = {
+            "date": timestamp,
+            "weight": weight,
+            "height": height,
+            "bmi": round(bmi, 2),
+            "category": category
+        }
+        self.store.append(username, entry)
+        
+        if username == self.history_user_var.get():
+            self.insert_history_row(entry, 0)
+            self.history_loaded += 1
+        self.refresh_history()
+        self.refresh_statistics()
+        self.save_data(lambda: messagebox.showinfo(
+            "Success", "BMI calculated and saved successfully!"))
+    
+    def setup_history_tab(self):
+        """Setup the history viewing interface"""
+        main_frame = tk.Frame(self.history_tab, bg=self.bg_color)
+        main_frame.pack(fill='both', expand=True, padx=20, pady=20)
+        
+        
+        tk.Label(main_frame, text="BMI History", font=("Arial", 20, "bold"), 
+                bg=self.bg_color).pack(pady=10)
+        
+       
+        select_frame = tk.Frame(main_frame, bg=self.bg_color)
+        select_frame.pack(pady=10)
+        
+        tk.Label(select_frame, text="Select User:", font=("Arial", 11), 
+                bg=self.bg_color).pack(side='left', padx=5)
+        
+        self.history_user_var = tk.StringVar()
+        self.history_user_combo = ttk.Combobox(select_frame, 
+                                               textvariable=self.history_user_var,
+                                               font=("Arial", 11), width=20, 
+                                               state='readonly')
+        self.history_user_combo.pack(side='left', padx=5)
+        self.history_user_combo.bind('<<ComboboxSelected>>', 
+                                     lambda e: self.display_user_history())
+        
+       
+        tree_frame = tk.Frame(main_frame)
+        tree_frame.pack(fill='both', expand=True, pady=10)
+        
+       
+        self.history_scrollbar = ttk.Scrollbar(tree_frame)
+        self.history_scrollbar.pack(side='right', fill='y')
+        
+       
+        self.history_tree = ttk.Treeview(tree_frame, 
+                                         columns=('Date', 'Weight', 'Height', 'BMI', 'Category'),
+                                         show='headings', yscrollcommand=self.on_history_scroll)
+        self.history_scrollbar.config(command=self.history_tree.yview)
+        
+        # Only the rows scrolled into view so far are materialized in the tree
+        self.history_loaded = 0
+        self.history_exhausted = True
+        
+      
+        self.history_tree.heading('Date', text='Date & Time')
+        self.history_tree.heading('Weight', text='Weight (kg)')
+        self.history_tree.heading('Height', text='Height (cm)')
+        self.history_tree.heading('BMI', text='BMI')
+        self.history_tree.heading('Category', text='Category')
+        
+        self.history_tree.column('Date', width=150)
+        self.history_tree.column('Weight', width=100)
+        self.history_tree.column('Height', width=100)
+        self.history_tree.column('BMI', width=80)
+        self.history_tree.column('Category', width=120)
+        
+        self.history_tree.pack(fill='both', expand=True)
+        
+        
+        btn_frame = tk.Frame(main_frame, bg=self.bg_color)
+        btn_frame.pack(pady=10)
+        
+        tk.Button(btn_frame, text="Delete Selected Entry", 
+                 command=self.delete_entry, font=("Arial", 10),
+                 bg="#e74c3c", fg="white", padx=10, pady=5).pack(side='left', padx=5)
+        
+        tk.Button(btn_frame, text="Clear All History for User", 
+                 command=self.clear_user_history, font=("Arial", 10),
+                 bg="#e67e22", fg="white", padx=10, pady=5).pack(side='left', padx=5)
+        
+        self.refresh_history()
+    
+    @timed("gui.refresh_history")
+    def refresh_history(self):
+        """Refresh the history dropdown"""
+        users = self.store.users()
+        self.history_user_combo['values'] = users
+        if not users:
+            self.history_user_var.set('')
+            self.display_user_history()
+        elif not self.history_user_var.get() or self.history_user_var.get() not in users:
+            self.history_user_var.set(users[0])
+            self.display_user_history()
+    
+    @timed("gui.display_user_history")
+    def display_user_history(self):
+        """Display history for selected user"""
+        
+        self.history_tree.delete(*self.history_tree.get_children())
+        self.history_loaded = 0
+        self.history_exhausted = False
+        self.load_history_page()
+    
+    @timed("gui.load_history_page")
+    def load_history_page(self):
+        """Add the next page of the selected user's history, newest first"""
+        username = self.history_user_var.get()
+        if not username or self.history_exhausted:
+            return
+        
+        entries = self.store.history_page(username, self.history_loaded,
+                                          self.HISTORY_PAGE_SIZE)
+        for entry in entries:
+            self.insert_history_row(entry, 'end')
+        self.history_loaded += len(entries)
+        self.history_exhausted = len(entries) < self.HISTORY_PAGE_SIZE
+    
+    def insert_history_row(self, entry, index):
+        """Insert one history entry into the tree at the given position, keyed by its id"""
+        # Until the next sync rebuilds the view, another instance's change can shift a page by a row
+        if isinstance(entry, dict) and not (entry.get('id') and self.history_tree.exists(entry['id'])):
+            self.history_tree.insert('', index, iid=entry.get('id'), values=(
+                entry.get('date', 'N/A'),
+                entry.get('weight', 'N/A'),
+                entry.get('height', 'N/A'),
+                entry.get('bmi', 'N/A'),
+                entry.get('category', 'N/A')
+            ))
+    
+    def on_history_scroll(self, first, last):
+        """Move the scrollbar and fetch more rows once the view nears the bottom"""
+        self.history_scrollbar.set(first, last)
+        if float(last) > 0.9:
+            self.load_history_page()
+    
+    def delete_entry(self):
+        """Delete selected history entry"""
+        selected = self.history_tree.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select an entry to delete")
+            return
+        
+        if messagebox.askyesno("Confirm", "Delete selected entry?"):
+            # Rows are keyed by entry id, so only the selected entry goes
+            entry_id = selected[0]
+            username = self.history_user_var.get()
+            
+            self.store.delete(username, entry_id)
+            self.history_tree.delete(entry_id)
+            self.history_loaded -= 1
+            # The delete only left a tombstone; squeeze it out off the Tk thread
+            self.worker.submit(self.store.purge, None, username)
+            self.refresh_statistics()
+            self.save_data(lambda: messagebox.showinfo(
+                "Success", "Entry deleted successfully"))
+    
+    def clear_user_history(self):
+        """Clear all history for selected user"""
+        username = self.history_user_var.get()
+        if not username:
+            return
+        
+        if messagebox.askyesno("Confirm", 
+                              f"Delete all history for {username}?"):
+            self.store.clear(username)
+            self.refresh_history()
+            self.refresh_statistics()
+            self.save_data(lambda: messagebox.showinfo(
+                "Success", "History cleared successfully"))
+    
+    def setup_statistics_tab(self):
+        """Setup the statistics and trends interface"""
+        main_frame = tk.Frame(self.statistics_tab, bg=self.bg_color)
+        main_frame.pack(fill='both', expand=True, padx=20, pady=20)
+        
+       
+        tk.Label(main_frame, text="Statistics & Trends", 
+                font=("Arial", 20, "bold"), bg=self.bg_color).pack(pady=10)
+        
+       
+        select_frame = tk.Frame(main_frame, bg=self.bg_color)
+        select_frame.pack(pady=10)
+        
+        tk.Label(select_frame, text="Select User:", font=("Arial", 11), 
+                bg=self.bg_color).pack(side='left', padx=5)
+        
+        self.stats_user_var = tk.StringVar()
+        self.stats_user_combo = ttk.Combobox(select_frame, 
+                                            textvariable=self.stats_user_var,
+                                            font=("Arial", 11), width=20, 
+                                            state='readonly')
+        self.stats_user_combo.pack(side='left', padx=5)
+        self.stats_user_combo.bind('<<ComboboxSelected>>', 
+                                   lambda e: self.display_statistics())
+        
+        
+        range_frame = tk.Frame(main_frame, bg=self.bg_color)
+        range_frame.pack()
+        
+        tk.Label(range_frame, text="From:", font=("Arial", 10),
+                bg=self.bg_color).pack(side='left', padx=5)
+        self.stats_start_var = tk.StringVar()
+        ttk.Entry(range_frame, textvariable=self.stats_start_var,
+                 font=("Arial", 10), width=12).pack(side='left')
+        
+        tk.Label(range_frame, text="To:", font=("Arial", 10),
+                bg=self.bg_color).pack(side='left', padx=5)
+        self.stats_end_var = tk.StringVar()
+        ttk.Entry(range_frame, textvariable=self.stats_end_var,
+                 font=("Arial", 10), width=12).pack(side='left')
+        
+        tk.Label(range_frame, text="Group by:", font=("Arial", 10),
+                bg=self.bg_color).pack(side='left', padx=5)
+        self.stats_group_var = tk.StringVar(value="Entries")
+        ttk.Combobox(range_frame, textvariable=self.stats_group_var,
+                    values=("Entries", "Daily", "Weekly", "Monthly"),
+                    font=("Arial", 10), width=9, state='readonly').pack(side='left')
+        
+        tk.Button(range_frame, text="Apply", command=self.display_statistics,
+                 font=("Arial", 10), padx=10).pack(side='left', padx=5)
+        
+       
+        self.stats_info_frame = tk.LabelFrame(main_frame, text="Summary Statistics",
+                                             font=("Arial", 11, "bold"), 
+                                             bg=self.bg_color, padx=20, pady=20)
+        self.stats_info_frame.pack(pady=10, fill='x')
+        
+        self.stats_label = tk.Label(self.stats_info_frame, text="", 
+                                    font=("Arial", 10), bg=self.bg_color, 
+                                    justify='left')
+        self.stats_label.pack()
+        
+        
+        self.chart_frame = tk.Frame(main_frame, bg='#bbc3ee')
+        self.chart_frame.pack(fill='both', expand=True, pady=10)
+        
+        self.chart_message = tk.Label(self.chart_frame, text="",
+                                      font=("Arial", 12), bg='#bbc3ee')
+        
+        # Built on first use and reused; series are cached per user by store version
+        self.chart_canvas = None
+        self.chart_line = None
+        self.chart_cache = OrderedDict()
+        self.chart_cache_lock = threading.Lock()
+        
+        self.refresh_statistics()
+    
+    @timed("gui.refresh_statistics")
+    def refresh_statistics(self):
+        """Refresh the statistics dropdown"""
+        users = self.store.users()
+        self.stats_user_combo['values'] = users
+        if users:
+            if not self.stats_user_var.get() or self.stats_user_var.get() not in users:
+                self.stats_user_var.set(users[0])
+            self.display_statistics()
+    
+    @timed("gui.display_statistics")
+    def display_statistics(self):
+        """Display statistics and trends for selected user"""
+        username = self.stats_user_var.get()
+        
+        if not username:
+            self.stats_label.config(text="No data available")
+          
+            self.show_chart_message("")
+            return
+        
+        try:
+            view = self.statistics_view()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        
+        with_chart = self.statistics_visible()
+        self.chart_pending = not with_chart
+        
+        # Only the newest request is shown if several are in flight
+        self.stats_request += 1
+        request = self.stats_request
+        self.worker.submit(self.load_statistics,
+                           lambda result, error: self.show_statistics(request, result, error),
+                           username, with_chart, view)
+    
+    def statistics_view(self):
+        """Return the (granularity, start, end) rollup query picked on the tab, or None for all entries"""
+        start = self.stats_start_var.get().strip()
+        end = self.stats_end_var.get().strip()
+        for value in (start, end):
+            if value and not rollups.is_day(value):
+                raise ValueError("Please enter dates as YYYY-MM-DD")
+        
+        group = self.stats_group_var.get()
+        if group == "Entries":
+            if not start and not end:
+                return None
+            # A date range is always answered from the rollups
+            group = "Daily"
+        return group.lower(), start or None, end or None
+    
+    @timed("gui.load_statistics")
+    def load_statistics(self, username, with_chart, view=None):
+        """Gather a user's statistics and chart series; runs on a worker thread"""
+        if view is not None:
+            granularity, start, end = view
+            # Weeks and months can reach past the range; days are exact, so totals come from them
+            daily = self.store.rollups(username, "daily", start, end)
+            series = None
+            if with_chart and daily:
+                buckets = daily if granularity == "daily" else self.store.rollups(username, *view)
+                series = self.rollup_series(buckets)
+            return rollups.summarize(daily), series
+        stats = self.store.stats(username)
+        series = self.trend_series(username) if with_chart and stats.count else None
+        return stats, series
+    
+    @timed("gui.show_statistics")
+    def show_statistics(self, request, result, error):
+        """Show statistics gathered by load_statistics"""
+        if request != self.stats_request:
+            return
+        if error is not None:
+            self.stats_label.config(text=f"Failed to load statistics: {error}")
+            return
+        
+        stats, series = result
+        
+        if stats is None:
+            self.stats_label.config(text="No entries in the selected range")
+            
+            self.show_chart_message("")
+            return
+        
+        if isinstance(stats, dict):
+            stats_text = f"""
+Entries in Range: {stats['count']}
+Latest Day Average BMI: {stats['latest_bmi_mean']:.2f}
+Average BMI: {stats['avg_bmi']:.2f}
+Lowest BMI: {stats['min_bmi']:.2f}
+Highest BMI: {stats['max_bmi']:.2f}
+
+Average Weight: {stats['avg_weight']:.2f} kg
+Weight Change: {stats['weight_change']:+.2f} kg
+        """
+        elif not stats.count:
+            self.stats_label.config(text="No data available")
+            
+            self.show_chart_message("")
+            return
+        else:
+            stats_text = f"""
+Total Entries: {stats.count}
+Latest BMI: {stats.latest_bmi:.2f}
+Average BMI: {stats.avg_bmi:.2f}
+Lowest BMI: {stats.bmi_min:.2f}
+Highest BMI: {stats.bmi_max:.2f}
+
+Average Weight: {stats.avg_weight:.2f} kg
+Weight Change: {stats.weight_change:+.2f} kg
+        """
+        
+        self.stats_label.config(text=stats_text)
+        
+        
+        if series is not None:
+            self.create_trend_chart(series)
+    
+    def statistics_visible(self):
+        """Check whether the Statistics & Trends tab is the one on screen"""
+        return self.notebook.select() == str(self.statistics_tab)
+    
+    def on_tab_changed(self):
+        """Draw the trend chart deferred while the statistics tab was hidden"""
+        if self.chart_pending and self.statistics_visible():
+            self.chart_pending = False
+            self.display_statistics()
+        if self.notebook.select() == str(self.diagnostics_tab):
+            self.display_diagnostics()
+    
+    def show_chart_message(self, text):
+        """Hide the trend chart and show a message in its place"""
+        if self.chart_canvas is not None:
+            self.chart_canvas.get_tk_widget().pack_forget()
+        self.chart_message.config(text=text)
+        self.chart_message.pack(expand=True)
+    
+    @timed("gui.trend_series")
+    def trend_series(self, username):
+        """Return the downsampled (dates, bmis) series for a user, cached by store version"""
+        from matplotlib.dates import date2num
+        
+        version = self.store.version(username)
+        with self.chart_cache_lock:
+            cached = self.chart_cache.get(username)
+            if cached is not None and cached[0] == version:
+                self.chart_cache.move_to_end(username)
+                return cached[1]
+        
+        # Copy under the store lock so a delete on the GUI thread cannot reshape it mid-read
+        with self.store.lock:
+            history = list(self.store.history(username))
+        
+        dates, bmis = [], []
+        for entry in history:
+            try:
+                dates.append(datetime.fromisoformat(entry['date']))
+            except (KeyError, TypeError, ValueError):
+                continue
+            bmis.append(entry['bmi'])
+        
+        # About one point per horizontal pixel of the 800px-wide chart
+        series = bmi_core.minmax_downsample(date2num(dates), bmis, 800)
+        
+        with self.chart_cache_lock:
+            self.chart_cache[username] = (version, series)
+            self.chart_cache.move_to_end(username)
+            if len(self.chart_cache) > self.CHART_CACHE_SIZE:
+                self.chart_cache.popitem(last=False)
+        return series
+    
+    def rollup_series(self, buckets):
+        """Return the (dates, mean bmis) series for rollup buckets, one point per bucket"""
+        from matplotlib.dates import date2num
+        
+        # Monthly keys are 'YYYY-MM'; plot them on the first of the month
+        dates = [datetime.fromisoformat(key if len(key) == 10 else key + "-01") for key, _ in buckets]
+        return date2num(dates), [bucket.bmi_mean for _, bucket in buckets]
+    
+    def build_trend_chart(self):
+        """Create the figure, axes and canvas that every trend chart is drawn on"""
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+        from matplotlib.figure import Figure
+        
+        fig = Figure(figsize=(8, 4), dpi=100)
+        ax = fig.add_subplot(111)
+        
+        
+        self.chart_line, = ax.plot([], [], marker='o', linewidth=2, markersize=8, 
+                                   color=self.secondary_color)
+        for threshold, color, label in bmi_core.SCHEME.threshold_lines():
+            ax.axhline(y=threshold, color=color, linestyle='--', alpha=0.5, label=label)
+        
+        ax.set_xlabel('Date', fontsize=10)
+        ax.set_ylabel('BMI', fontsize=10)
+        ax.set_title('BMI Trend Over Time', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best', fontsize=8)
+        
+        locator = AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+        
+        fig.tight_layout()
+        
+       
+        self.chart_canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
+    
+    @timed("gui.create_trend_chart")
+    def create_trend_chart(self, series):
+        """Create BMI trend chart from a (dates, bmis) series"""
+        dates, bmis = series
+        
+        if len(bmis) < 2:
+            self.show_chart_message("Need at least 2 entries to show trends")
+            return
+        
+        if self.chart_canvas is None:
+            self.build_trend_chart()
+        
+        # Markers only help while individual points can still be told apart
+        self.chart_line.set_data(dates, bmis)
+        self.chart_line.set_marker('o' if len(bmis) <= 100 else '')
+        ax = self.chart_line.axes
+        ax.relim()
+        ax.autoscale_view()
+        
+        self.chart_message.pack_forget()
+        self.chart_canvas.get_tk_widget().pack(fill='both', expand=True)
+        self.chart_canvas.draw_idle()
+
+    def setup_cohort_tab(self):
+        """Setup the population statistics interface"""
+        main_frame = tk.Frame(self.cohort_tab, bg=self.bg_color)
+        main_frame.pack(fill='both', expand=True, padx=20, pady=20)
+        
+        
+        tk.Label(main_frame, text="Cohort Statistics", font=("Arial", 20, "bold"), 
+                bg=self.bg_color).pack(pady=10)
+        
+        self.cohort_button = tk.Button(main_frame, text="Analyze All Users",
+                                       command=self.compute_cohort,
+                                       font=("Arial", 12, "bold"), bg=self.primary_color,
+                                       fg="white", padx=20, pady=10, cursor="hand2")
+        self.cohort_button.pack(pady=10)
+        
+        
+        self.cohort_frame = tk.LabelFrame(main_frame, text="All Users",
+                                          font=("Arial", 11, "bold"), 
+                                          bg=self.bg_color, padx=20, pady=20)
+        self.cohort_frame.pack(pady=10, fill='both', expand=True)
+        
+        self.cohort_label = tk.Label(self.cohort_frame, text="", 
+                                     font=("Arial", 10), bg=self.bg_color, 
+                                     justify='left')
+        self.cohort_label.pack()
+    
+    def compute_cohort(self):
+        """Start the cross-user analysis in the background"""
+        self.cohort_button.config(state='disabled')
+        self.cohort_label.config(text="Analyzing...")
+        self.worker.submit(cohort.analyze, self.show_cohort, self.store)
+    
+    def show_cohort(self, result, error):
+        """Show the cohort summary computed by compute_cohort"""
+        self.cohort_button.config(state='normal')
+        if error is not None:
+            self.cohort_label.config(text=f"Analysis failed: {error}")
+            return
+        
+        summary = result.summary()
+        if not summary['users']:
+            self.cohort_label.config(text="No data available")
+            return
+        
+        def fmt(value, unit=""):
+            return "N/A" if value is None else f"{value:+.1f}{unit}" if unit else f"{value:.1f}"
+        
+        lines = [f"Users: {summary['users']}    Entries: {summary['entries']}", "",
+                 "Latest category per user:"]
+        for name, count in summary['latest_categories'].items():
+            lines.append(f"    {name}: {count} ({count / summary['users']:.1%})")
+        bmi = summary['latest_bmi_percentiles']
+        lines += ["", "Latest BMI percentiles:",
+                  "    " + "   ".join(f"{q}: {fmt(v)}" for q, v in bmi.items()),
+                  "", "Weight change (median, p5 to p95):"]
+        for window, change in summary['weight_change'].items():
+            lines.append(f"    Last {window}: {fmt(change['p50'], ' kg')} "
+                         f"({fmt(change['p5'], ' kg')} to {fmt(change['p95'], ' kg')}), "
+                         f"{change['users']} users")
+        
+        self.cohort_label.config(text="\n".join(lines))
+    
+    def setup_diagnostics_tab(self):
+        """Setup the performance diagnostics interface"""
+        main_frame = tk.Frame(self.diagnostics_tab, bg=self.bg_color)
+        main_frame.pack(fill='both', expand=True, padx=20, pady=20)
+        
+        
+        tk.Label(main_frame, text="Diagnostics", font=("Arial", 20, "bold"), 
+                bg=self.bg_color).pack(pady=10)
+        
+        status = "on" if instrument.ENABLED else "off (BMI_METRICS=0)"
+        tk.Label(main_frame, text=f"Timing collection is {status}", font=("Arial", 10), 
+                bg=self.bg_color).pack()
+        
+        
+        tree_frame = tk.Frame(main_frame)
+        tree_frame.pack(fill='both', expand=True, pady=10)
+        
+        columns = ('Operation', 'Calls', 'Mean', 'p50', 'p95', 'p99', 'Max')
+        self.diagnostics_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
+        for column in columns:
+            self.diagnostics_tree.heading(column, text=column if column in ('Operation', 'Calls')
+                                          else f"{column} (ms)")
+            self.diagnostics_tree.column(column, width=220 if column == 'Operation' else 80)
+        self.diagnostics_tree.pack(fill='both', expand=True)
+        
+        
+        btn_frame = tk.Frame(main_frame, bg=self.bg_color)
+        btn_frame.pack(pady=10)
+        
+        tk.Button(btn_frame, text="Refresh", command=self.display_diagnostics,
+                 font=("Arial", 10), padx=10, pady=5).pack(side='left', padx=5)
+        
+        tk.Button(btn_frame, text="Export JSON", command=self.export_diagnostics,
+                 font=("Arial", 10), padx=10, pady=5).pack(side='left', padx=5)
+        
+        tk.Button(btn_frame, text="Reset", command=self.reset_diagnostics,
+                 font=("Arial", 10), padx=10, pady=5).pack(side='left', padx=5)
+    
+    def display_diagnostics(self):
+        """Show the recorded timings of every instrumented operation"""
+        self.diagnostics_tree.delete(*self.diagnostics_tree.get_children())
+        for name, metrics in instrument.snapshot().items():
+            self.diagnostics_tree.insert('', 'end', values=(
+                name,
+                metrics['count'],
+                f"{metrics['mean_ms']:.2f}",
+                f"{metrics['p50_ms']:.2f}",
+                f"{metrics['p95_ms']:.2f}",
+                f"{metrics['p99_ms']:.2f}",
+                f"{metrics['max_ms']:.2f}"
+            ))
+    
+    def export_diagnostics(self):
+        """Save the recorded timings to a JSON file"""
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("JSON files", "*.json")],
+                                            initialfile="bmi_metrics.json")
+        if not path:
+            return
+        try:
+            instrument.export_json(path)
+            messagebox.showinfo("Success", f"Metrics exported to {path}")
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export metrics: {str(e)}")
+    
+    def reset_diagnostics(self):
+        """Clear the recorded timings"""
+        instrument.reset()
+        self.display_diagnostics()
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = BMICalculator(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""Compare the NumPy and pure-Python batch BMI paths
+
+Usage: python benchmarks/bench_batch.py [rows]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bmi_core import batch
+
+
+def time_path(weights, heights, use_numpy):
+    start = time.perf_counter()
+    batch.score_batch(weights, heights, use_numpy=use_numpy)
+    return time.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(42)
+    weights = [rng.uniform(35, 180) for _ in range(rows)]
+    heights = [rng.uniform(140, 210) for _ in range(rows)]
+
+    python_time = time_path(weights, heights, use_numpy=False)
+    print(f"pure python: {python_time:.3f}s ({rows / python_time:,.0f} rows/s)")
+
+    np = batch.load_numpy()
+    if np is None:
+        print("numpy: not installed")
+        return
+    weights = np.array(weights)
+    heights = np.array(heights)
+    numpy_time = time_path(weights, heights, use_numpy=True)
+    print(f"numpy:       {numpy_time:.3f}s ({rows / numpy_time:,.0f} rows/s)")
+    print(f"speedup:     {python_time / numpy_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Check that importing bmi_core stays within a cold-start time budget
+
+Runs `python -X importtime -c "import bmi_core"` in a fresh interpreter a few
+times and compares the best cumulative import time against the budget.
+
+Usage: python benchmarks/bench_import.py [--budget-ms 100] [--runs 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time_us(module):
+    """Return the cumulative import time of `module` in microseconds, plus the modules it pulled in"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    imported = []
+    total = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        imported.append(name)
+        if name == module:
+            total = int(cumulative)
+    return total, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=100)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        total, imported = import_time_us("bmi_core")
+        best = total if best is None else min(best, total)
+
+    heavy = [name for name in ("tkinter", "matplotlib", "numpy") if name in imported]
+    print(f"bmi_core cold import: {best / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if heavy:
+        print(f"FAIL: bmi_core imported {', '.join(heavy)}")
+        return 1
+    if best / 1000 > args.budget_ms:
+        print("FAIL: over budget")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
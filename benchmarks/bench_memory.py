@@ -0,0 +1,53 @@
+"""Compare bytes per entry of list-of-dict histories and UserHistory
+
+Usage: python benchmarks/bench_memory.py [entries]
+"""
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bmi_core import calculate_bmi, categorize_bmi
+from bmi_core.columnar import UserHistory, seconds_to_date
+
+
+def make_entries(count):
+    rng = random.Random(42)
+    start = 1_600_000_000
+    for i in range(count):
+        weight = round(rng.uniform(40, 150), 1)
+        height = round(rng.uniform(145, 205), 1)
+        bmi = calculate_bmi(weight, height)
+        yield {
+            "id": f"{rng.getrandbits(64):016x}",
+            "date": seconds_to_date(start + i * 3600),
+            "weight": weight,
+            "height": height,
+            "bmi": round(bmi, 2),
+            "category": categorize_bmi(bmi)[0],
+        }
+
+
+def measure(build, count):
+    """Return bytes allocated per entry by build(entries)"""
+    tracemalloc.start()
+    result = build(make_entries(count))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    as_dicts = measure(list, count)
+    as_columns = measure(UserHistory.from_entries, count)
+    print(f"{count:,} entries")
+    print(f"list of dicts: {as_dicts:7.1f} bytes/entry")
+    print(f"UserHistory:   {as_columns:7.1f} bytes/entry ({as_dicts / as_columns:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Compare cold-start load time of bmi_data.json and the binary snapshot
+
+Writes a synthetic dataset in both formats, then times, each in a fresh
+interpreter: json.load of the whole file, opening the binary snapshot and
+reading one user, and reading every user from the binary snapshot.
+
+Usage: python benchmarks/bench_snapshot.py [users] [entries_per_user] [workdir]
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bmi_core.binfmt import write_snapshot
+from bmi_core.columnar import UserHistory
+
+LOADERS = {
+    "json (all users)": "import json; json.load(open({json!r}))",
+    "binary (one user)": "from bmi_core.binfmt import BinarySnapshot; "
+                         "s = BinarySnapshot({bin!r}); s.read_user('user0')",
+    "binary (all users)": "from bmi_core.binfmt import BinarySnapshot; "
+                          "s = BinarySnapshot({bin!r}); [s.read_user(u) for u in s.users()]",
+}
+
+
+def make_history(rng, entries):
+    history = UserHistory()
+    start = rng.randrange(1_500_000_000, 1_600_000_000)
+    for i in range(entries):
+        history.ids.append(rng.getrandbits(64))
+        history.dates.append(start + i * 86400)
+        history.weights.append(round(rng.uniform(40, 150), 1))
+        history.heights.append(round(rng.uniform(145, 205), 1))
+        history.bmis.append(round(rng.uniform(15, 45), 2))
+        history.categories.append(rng.randrange(4))
+    return history
+
+
+def write_dataset(workdir, users, entries):
+    rng = random.Random(42)
+    json_path = os.path.join(workdir, "bmi_data.json")
+    bin_path = os.path.join(workdir, "bmi_data.bmi")
+
+    def histories():
+        for i in range(users):
+            yield f"user{i}", make_history(rng, entries)
+
+    # Stream the JSON so the generator never holds every user at once
+    with open(json_path, 'w') as f:
+        f.write("{")
+        for i, (username, history) in enumerate(histories()):
+            f.write(",\n" if i else "\n")
+            f.write(f"{json.dumps(username)}: {json.dumps(history.to_list(), indent=4)}")
+        f.write("\n}")
+    rng.seed(42)
+    write_snapshot(bin_path, histories())
+    return json_path, bin_path
+
+
+def time_loader(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    entries = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    # A workdir given on the command line is kept; a temporary one is removed afterwards
+    workdir = sys.argv[3] if len(sys.argv) > 3 else tempfile.mkdtemp(prefix="bmi-bench-")
+    keep = len(sys.argv) > 3
+
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        json_path, bin_path = write_dataset(workdir, users, entries)
+        print(f"{users:,} users x {entries:,} entries")
+        print(f"json:   {os.path.getsize(json_path) / 1e6:,.1f} MB")
+        print(f"binary: {os.path.getsize(bin_path) / 1e6:,.1f} MB")
+        for name, code in LOADERS.items():
+            elapsed = time_loader(code.format(json=json_path, bin=bin_path))
+            print(f"{name:20} {elapsed:.2f}s")
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Benchmark the save, compaction, history, statistics and chart paths of the GUI
+
+The BMICalculator methods run against a synthetic dataset with stub widgets
+in place of Tk and matplotlib's Agg canvas in place of the Tk canvas, so no
+display is needed. A save only appends to the journal until compact_every
+records have built up, which the timed saves never reach, so the snapshot
+rewrite a compaction does is timed on its own. Results are written as JSON
+and can be compared against an earlier run; any path slower than --threshold
+times its old median is flagged and the exit status is 1.
+
+Usage: python benchmarks/run.py [--users 100] [--entries 1000] [--store journal]
+                                [--output results.json] [--compare old.json]
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import OrderedDict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bmi_core import calculate_bmi, categorize_bmi, open_store
+from bmi_core.columnar import seconds_to_date
+from bmi_core.worker import LockedStore
+
+
+class StubVar:
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class StubWidget:
+    """Accepts any widget call and does nothing"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class StubTree:
+    """Just enough of ttk.Treeview for the history methods"""
+
+    def __init__(self):
+        self.rows = OrderedDict()
+        self.next_id = 0
+
+    def insert(self, parent, index, iid=None, values=()):
+        self.next_id += 1
+        item_id = iid or f"I{self.next_id}"
+        self.rows[item_id] = values
+        if index == 0:
+            self.rows.move_to_end(item_id, last=False)
+        return item_id
+
+    def delete(self, *item_ids):
+        for item_id in item_ids:
+            del self.rows[item_id]
+
+    def get_children(self):
+        return tuple(self.rows)
+
+    def exists(self, item_id):
+        return item_id in self.rows
+
+    def item(self, item_id):
+        return {"values": list(self.rows[item_id])}
+
+
+def load_gui():
+    """Import 'BMI calculator.py' with matplotlib's Tk canvas swapped for Agg"""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    class HeadlessCanvas(FigureCanvasAgg):
+        def __init__(self, figure, master=None):
+            super().__init__(figure)
+
+        def get_tk_widget(self):
+            return StubWidget()
+
+        def draw_idle(self):
+            self.draw()
+
+    backend = types.ModuleType("matplotlib.backends.backend_tkagg")
+    backend.FigureCanvasTkAgg = HeadlessCanvas
+    sys.modules["matplotlib.backends.backend_tkagg"] = backend
+
+    spec = importlib.util.spec_from_file_location("bmi_gui", os.path.join(ROOT, "BMI calculator.py"))
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    return gui
+
+
+def make_app(gui, store):
+    """Build a BMICalculator without Tk, wired to stub widgets"""
+    app = gui.BMICalculator.__new__(gui.BMICalculator)
+    app.store = store
+    app.secondary_color = "#E161B2"
+    app.history_tree = StubTree()
+    app.history_user_var = StubVar()
+    app.history_scrollbar = StubWidget()
+    app.history_loaded = 0
+    app.history_exhausted = True
+    app.stats_user_var = StubVar()
+    app.stats_label = StubWidget()
+    app.stats_request = 0
+    app.chart_frame = None
+    app.chart_message = StubWidget()
+    app.chart_canvas = None
+    app.chart_line = None
+    app.chart_cache = OrderedDict()
+    app.chart_cache_lock = threading.Lock()
+    return app
+
+
+def write_dataset(path, users, entries):
+    """Write a bmi_data.json with users x entries synthetic measurements"""
+    rng = random.Random(42)
+    users_data = {}
+    for u in range(users):
+        start = rng.randrange(1_500_000_000, 1_600_000_000)
+        history = []
+        for i in range(entries):
+            weight = round(rng.uniform(40, 150), 1)
+            height = round(rng.uniform(145, 205), 1)
+            bmi = calculate_bmi(weight, height)
+            history.append({
+                "date": seconds_to_date(start + i * 86400),
+                "weight": weight,
+                "height": height,
+                "bmi": round(bmi, 2),
+                "category": categorize_bmi(bmi)[0],
+            })
+        users_data[f"user{u}"] = history
+    with open(path, 'w') as f:
+        json.dump(users_data, f, indent=4)
+
+
+def timed(fn, runs):
+    """Return per-run timings of fn in milliseconds"""
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run_benchmarks(app, username, runs):
+    results = {}
+
+    def append():
+        app.store.append(username, {
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "weight": 70.0, "height": 175.0, "bmi": 22.86, "category": "Normal weight",
+        })
+
+    def save(i):
+        append()
+        app.store.commit()
+
+    def compaction(i):
+        append()
+        app.store.compact()
+
+    def history(i):
+        app.history_user_var.set(username)
+        app.display_user_history()
+
+    def stats(i):
+        app.show_statistics(app.stats_request, app.load_statistics(username, False), None)
+
+    def stats_after_delete(i):
+        # Deleting drops the cached statistics, so this measures a full rebuild
+        app.store.delete(username, "not-an-id")
+        app.show_statistics(app.stats_request, app.load_statistics(username, False), None)
+
+    def stats_monthly(i):
+        app.show_statistics(app.stats_request,
+                            app.load_statistics(username, True, ("monthly", None, None)), None)
+
+    def chart(i):
+        app.chart_cache.clear()
+        app.create_trend_chart(app.trend_series(username))
+
+    def chart_cached(i):
+        app.create_trend_chart(app.trend_series(username))
+
+    cases = [("save", save)]
+    if getattr(app.store, 'compact', None) is not None:
+        cases.append(("compaction", compaction))
+    cases += [("history", history), ("statistics", stats),
+              ("statistics_after_delete", stats_after_delete),
+              ("statistics_monthly", stats_monthly),
+              ("chart", chart), ("chart_cached", chart_cached)]
+    for name, fn in cases:
+        timings = timed(fn, runs)
+        results[name] = {
+            "median_ms": statistics.median(timings),
+            "min_ms": min(timings),
+            "runs": runs,
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the change against a previous run and return the names that regressed"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"  {name:25} {old['median_ms']:9.2f} -> {result['median_ms']:9.2f} ms ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--entries", type=int, default=1000, help="entries per user")
+    parser.add_argument("--store", default="journal", help="storage backend to benchmark")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="flag paths whose median grew by more than this factor")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bmi-bench-")
+    try:
+        data_file = os.path.join(workdir, "bmi_data.json")
+        write_dataset(data_file, args.users, args.entries)
+
+        store = LockedStore(open_store(data_file, args.store))
+        start = time.perf_counter()
+        store.load()
+        load_ms = (time.perf_counter() - start) * 1000
+
+        app = make_app(load_gui(), store)
+        results = {"load": {"median_ms": load_ms, "min_ms": load_ms, "runs": 1}}
+        results.update(run_benchmarks(app, "user0", args.runs))
+        store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "users": args.users,
+            "entries": args.entries,
+            "store": args.store,
+            "python": platform.python_version(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+    print(f"{args.users} users x {args.entries} entries, {args.store} store")
+    for name, result in results.items():
+        print(f"  {name:25} {result['median_ms']:9.2f} ms median")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare}:")
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Check that the shared store loses no updates when many processes write at once
+
+Each process opens its own SharedStore on the same data file. It appends
+entries for its own user and for one user that every process writes to,
+commits every few changes, and deletes every tenth entry it wrote. On the
+shared user it also deletes every seventh entry its neighbour wrote, once it
+has seen it. Each process fills a scratch user that its neighbour clears once
+every entry has arrived, then refills it. The final data is then reloaded and
+compared with what every process meant to leave behind. The exit status is 1
+if anything was lost, duplicated or not deleted.
+
+Usage: python benchmarks/stress_shared.py [--processes 8] [--entries 500]
+                                          [--commit-every 5] [--compact-every 200]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bmi_core import calculate_bmi, categorize_bmi, instrument
+from bmi_core.columnar import seconds_to_date
+from bmi_core.storage import SharedStore
+
+SHARED_USER = "shared"
+SCRATCH_ENTRIES = 20
+SCRATCH_TIMEOUT = 60
+
+
+def make_entry(process, i):
+    # Dates are unique per process and entry, so they identify entries when checking
+    weight = 50 + (process * 7 + i) % 80
+    bmi = calculate_bmi(weight, 175)
+    return {
+        "date": seconds_to_date(1_500_000_000 + process * 10_000_000 + i),
+        "weight": float(weight),
+        "height": 175.0,
+        "bmi": round(bmi, 2),
+        "category": categorize_bmi(bmi)[0],
+    }
+
+
+def expected_dates(process, entries):
+    """Dates this process leaves behind: (own user's, shared user's before deletes, scratch user's)"""
+    own = {make_entry(process, i)["date"] for i in range(entries) if i % 10}
+    shared = {make_entry(process, i)["date"] for i in range(entries, entries * 2)}
+    scratch = {make_entry(process, i)["date"]
+               for i in range(entries * 2 + SCRATCH_ENTRIES, entries * 2 + SCRATCH_ENTRIES * 2)}
+    return own, shared, scratch
+
+
+class Neighbour:
+    """Deletes and clears one process applies to the next process's entries"""
+
+    def __init__(self, process, processes, entries):
+        self.process = (process + 1) % processes
+        self.targets = {make_entry(self.process, entries + i)["date"]
+                        for i in range(0, entries, 7)}
+        self.scratch = f"scratch{self.process}"
+        self.first_fill = {make_entry(self.process, entries * 2 + i)["date"]
+                           for i in range(SCRATCH_ENTRIES)}
+        self.deleted = set()
+        self.cleared = False
+
+    def act(self, store):
+        """Delete the target entries seen so far, and clear the scratch user once it is full"""
+        changed = store.sync()
+        if SHARED_USER in changed:
+            for entry in store.history(SHARED_USER):
+                if entry["date"] in self.targets and entry["date"] not in self.deleted:
+                    store.delete(SHARED_USER, entry["id"])
+                    self.deleted.add(entry["date"])
+        if not self.cleared and {entry["date"] for entry in store.history(self.scratch)} >= self.first_fill:
+            store.clear(self.scratch)
+            self.cleared = True
+
+
+def writer(data_file, process, processes, entries, commit_every, compact_every):
+    instrument.reset()
+    store = SharedStore(data_file, compact_every)
+    store.load()
+    username = f"user{process}"
+    scratch = f"scratch{process}"
+    neighbour = Neighbour(process, processes, entries)
+    for i in range(SCRATCH_ENTRIES):
+        store.append(scratch, make_entry(process, entries * 2 + i))
+    store.commit()
+
+    changes = 0
+    for i in range(entries):
+        entry_id = store.append(username, make_entry(process, i))
+        store.append(SHARED_USER, make_entry(process, entries + i))
+        changes += 1
+        if i % 10 == 0:
+            store.delete(username, entry_id)
+        if changes % commit_every == 0:
+            store.commit()
+            neighbour.act(store)
+    store.commit()
+
+    # Wait until our scratch user has been cleared and the neighbour's is full enough to clear
+    deadline = time.monotonic() + SCRATCH_TIMEOUT
+    while time.monotonic() < deadline:
+        neighbour.act(store)
+        store.commit()
+        if neighbour.cleared and not store.history(scratch):
+            break
+        time.sleep(0.01)
+    for i in range(SCRATCH_ENTRIES, SCRATCH_ENTRIES * 2):
+        store.append(scratch, make_entry(process, entries * 2 + i))
+    store.commit()
+    store.close()
+    return instrument.snapshot().get("store.lock_held"), neighbour.deleted
+
+
+def check(data_file, processes, entries, deleted):
+    """Reload the data and return a list of problems found"""
+    store = SharedStore(data_file)
+    store.load()
+    problems = []
+    shared_expected = set()
+    for process in range(processes):
+        own, shared, scratch = expected_dates(process, entries)
+        shared_expected |= shared
+        for username, expected in ((f"user{process}", own), (f"scratch{process}", scratch)):
+            dates = [entry["date"] for entry in store.history(username)]
+            if len(dates) != len(set(dates)) or set(dates) != expected:
+                problems.append(f"{username}: {len(dates)} entries, expected {len(expected)}")
+    shared_expected -= deleted
+    dates = [entry["date"] for entry in store.history(SHARED_USER)]
+    if len(dates) != len(set(dates)) or set(dates) != shared_expected:
+        problems.append(f"{SHARED_USER}: {len(dates)} entries, expected {len(shared_expected)}")
+    store.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--entries", type=int, default=500, help="entries per process and user")
+    parser.add_argument("--commit-every", type=int, default=5, help="entries between commits")
+    parser.add_argument("--compact-every", type=int, default=200,
+                        help="journal records between compactions")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bmi-stress-")
+    try:
+        data_file = os.path.join(workdir, "bmi_data.json")
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.starmap(writer, [
+                (data_file, process, args.processes, args.entries, args.commit_every,
+                 args.compact_every)
+                for process in range(args.processes)
+            ])
+        elapsed = time.perf_counter() - start
+        lock_times = [metrics for metrics, _ in results]
+        deleted = set().union(*(dates for _, dates in results))
+        problems = check(data_file, args.processes, args.entries, deleted)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    changes = args.processes * (args.entries * 2.1 + SCRATCH_ENTRIES * 2 + 1) + len(deleted)
+    commits = sum(metrics["count"] for metrics in lock_times if metrics)
+    print(f"{args.processes} processes, {changes:.0f} changes in {commits} commits, "
+          f"{elapsed:.2f} s ({changes / elapsed:.0f} changes/s)")
+    held = [metrics for metrics in lock_times if metrics]
+    if held:
+        print(f"Lock held: mean {sum(m['mean_ms'] for m in held) / len(held):.2f} ms, "
+              f"worst p99 {max(m['p99_ms'] for m in held):.2f} ms")
+    for problem in problems:
+        print(f"  LOST UPDATE {problem}")
+    print("OK" if not problems else f"{len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+"""Core BMI logic and persistence, usable without the Tk GUI"""
+from .bmi import (CATEGORIES, CATEGORY_NAMES, SCHEME, SCHEMES, THRESHOLDS, calculate_bmi,
+                  categorize_bmi, format_result, get_scheme, validate_measurement)
+from .batch import calculate_bmi_batch, categorize_bmi_batch, score_batch
+from .downsample import minmax_downsample
+from .stats import RunningStats
+from .storage import BinaryStore, JSONStore, JournalStore, SharedStore, SQLiteStore, open_store
+
+__all__ = [
+    "CATEGORIES", "CATEGORY_NAMES", "SCHEME", "SCHEMES", "THRESHOLDS", "calculate_bmi",
+    "categorize_bmi", "format_result", "get_scheme", "validate_measurement",
+    "calculate_bmi_batch", "categorize_bmi_batch", "score_batch",
+    "minmax_downsample", "RunningStats",
+    "JSONStore", "JournalStore", "BinaryStore", "SharedStore", "SQLiteStore", "open_store",
+]
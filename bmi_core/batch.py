@@ -0,0 +1,56 @@
+"""Score whole arrays of measurements at once
+
+NumPy is used when it is installed; otherwise the same results come from the
+scalar functions in bmi_core.bmi.
+"""
+from bisect import bisect_right
+
+from .bmi import THRESHOLDS, calculate_bmi
+
+_numpy = False
+
+
+def load_numpy():
+    """Import NumPy on first use so importing bmi_core stays fast; None if it is not installed"""
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def calculate_bmi_batch(weights, heights, use_numpy=None):
+    """Calculate BMI for parallel sequences of weights (kg) and heights (cm)"""
+    np = load_numpy()
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        weights = np.asarray(weights, dtype=np.float64)
+        height_m = np.asarray(heights, dtype=np.float64) / 100
+        return weights / (height_m * height_m)
+    return [calculate_bmi(w, h) for w, h in zip(weights, heights)]
+
+
+def categorize_bmi_batch(bmis, use_numpy=None):
+    """Return category codes (indexes into CATEGORY_NAMES) for a sequence of BMIs"""
+    np = load_numpy()
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        return np.digitize(np.asarray(bmis, dtype=np.float64), THRESHOLDS).astype(np.uint8)
+    return [bisect_right(THRESHOLDS, bmi) for bmi in bmis]
+
+
+def score_batch(weights, heights=None, use_numpy=None):
+    """Return (bmis, category codes) for the given measurements
+
+    `weights` may also be a NumPy structured array with 'weight' and 'height'
+    fields, in which case `heights` is omitted.
+    """
+    if heights is None:
+        weights, heights = weights['weight'], weights['height']
+    bmis = calculate_bmi_batch(weights, heights, use_numpy)
+    return bmis, categorize_bmi_batch(bmis, use_numpy)
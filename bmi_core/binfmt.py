@@ -0,0 +1,166 @@
+"""Binary snapshot format with a per-user index, read through mmap
+
+Layout (little-endian):
+
+    header   magic "BMIS", version, 16-byte generation id, user count, index offset
+    records  per user, one fixed-width block per column: uint64 entry id,
+             int64 epoch seconds, float64 weight, float64 height, float64 BMI,
+             uint8 category code
+             or, for a history whose entries do not fit the columns, its
+             entries as UTF-8 JSON
+    index    per user: records offset, record count (JSON: byte length),
+             name length, kind (0 columns, 1 JSON), UTF-8 name
+
+Opening a snapshot only reads the header and index, so one user's history can
+be loaded without touching anyone else's.
+
+Usage: python -m bmi_core.binfmt to-binary bmi_data.json bmi_data.bmi
+       python -m bmi_core.binfmt to-json bmi_data.bmi bmi_data.json
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import uuid
+from array import array
+
+from .columnar import COLUMNS, UserHistory, assign_missing_ids
+
+MAGIC = b"BMIS"
+VERSION = 1
+HEADER = struct.Struct("<4sH16sIQ")
+INDEX_ENTRY = struct.Struct("<QQHB")
+KIND_COLUMNS = 0
+KIND_JSON = 1
+_SWAP = sys.byteorder != "little"
+
+
+def write_snapshot(path, users):
+    """Write (username, history) pairs to path atomically and return the generation id
+
+    A UserHistory is stored as columns; any other history (a plain list of
+    entries that did not fit the columns) is stored as JSON.
+    """
+    generation = uuid.uuid4().bytes
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, generation, 0, 0))
+        index = []
+        for username, history in users:
+            offset = f.tell()
+            if not isinstance(history, UserHistory):
+                data = json.dumps(list(history)).encode()
+                f.write(data)
+                index.append((username, offset, len(data), KIND_JSON))
+                continue
+            history.compact()
+            for name in COLUMNS:
+                column = getattr(history, name)
+                if _SWAP:
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                column.tofile(f)
+            index.append((username, offset, len(history), KIND_COLUMNS))
+
+        index_offset = f.tell()
+        for username, offset, count, kind in index:
+            name = username.encode()
+            f.write(INDEX_ENTRY.pack(offset, count, len(name), kind) + name)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, generation, len(index), index_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return generation.hex()
+
+
+class BinarySnapshot:
+    """Read-only view of a binary snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, generation, user_count, index_offset = HEADER.unpack_from(self._mm)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a BMI binary snapshot")
+        self.generation = generation.hex()
+
+        self.index = {}
+        pos = index_offset
+        for _ in range(user_count):
+            offset, count, name_length, kind = INDEX_ENTRY.unpack_from(self._mm, pos)
+            pos += INDEX_ENTRY.size
+            username = self._mm[pos:pos + name_length].decode()
+            pos += name_length
+            self.index[username] = (offset, count, kind)
+
+    def users(self):
+        return list(self.index)
+
+    def read_user(self, username):
+        """Load one user's history as a UserHistory, or a list if it was stored as JSON"""
+        offset, count, kind = self.index[username]
+        if kind == KIND_JSON:
+            return json.loads(self._mm[offset:offset + count])
+        history = UserHistory()
+        pos = offset
+        for name in COLUMNS:
+            column = getattr(history, name)
+            size = count * column.itemsize
+            column.frombytes(self._mm[pos:pos + size])
+            if _SWAP:
+                column.byteswap()
+            pos += size
+        return history
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def json_to_binary(json_path, binary_path):
+    """Convert a bmi_data.json file to a binary snapshot"""
+    with open(json_path, 'r') as f:
+        users_data = json.load(f)
+    for username, history in users_data.items():
+        if isinstance(history, list):
+            assign_missing_ids(username, history)
+    write_snapshot(binary_path, ((username, UserHistory.from_entries(history))
+                                 for username, history in users_data.items()))
+
+
+def binary_to_json(binary_path, json_path):
+    """Convert a binary snapshot back to the bmi_data.json layout"""
+    snapshot = BinarySnapshot(binary_path)
+    try:
+        users_data = {username: list(snapshot.read_user(username))
+                      for username in snapshot.users()}
+    finally:
+        snapshot.close()
+    with open(json_path, 'w') as f:
+        json.dump(users_data, f, indent=4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert between bmi_data.json and binary snapshots")
+    parser.add_argument("direction", choices=("to-binary", "to-json"))
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args(argv)
+
+    if args.direction == "to-binary":
+        json_to_binary(args.source, args.target)
+    else:
+        binary_to_json(args.source, args.target)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""BMI formula, category registry and threshold schemes
+
+Every consumer of category names, colors, cutoffs and advice reads them from
+here. The cutoffs come from the active scheme, chosen with the BMI_SCHEME
+environment variable ("who" by default, or "asian").
+"""
+import os
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+
+# color is for result text; swatch marks the category in reference tables and charts
+Category = namedtuple("Category", "name label color swatch advice")
+
+CATEGORY_INFO = (
+    Category("Underweight", "Underweight", "#3498db", "#3498db",
+             "You may need to gain weight. Consult a healthcare provider."),
+    Category("Normal weight", "Normal", "#193ab1", "#2ecc71",
+             "Great! You're at a healthy weight. Keep it up!"),
+    Category("Overweight", "Overweight", "#f39c12", "#f39c12",
+             "Consider a balanced diet and regular exercise."),
+    Category("Obese", "Obese", "#e74c3c", "#e74c3c",
+             "Please consult a healthcare provider for guidance."),
+)
+# Stored category codes are indexes into CATEGORY_NAMES, so the order must not change
+CATEGORY_NAMES = tuple(category.name for category in CATEGORY_INFO)
+CATEGORIES = tuple((category.name, category.color) for category in CATEGORY_INFO)
+
+
+class CategoryScheme:
+    """Cutoffs between the categories, compiled into a bisect lookup"""
+
+    def __init__(self, name, title, thresholds):
+        thresholds = tuple(thresholds)
+        if len(thresholds) != len(CATEGORY_INFO) - 1 or list(thresholds) != sorted(set(thresholds)):
+            raise ValueError(f"A scheme needs {len(CATEGORY_INFO) - 1} increasing thresholds")
+        self.name = name
+        self.title = title
+        self.thresholds = thresholds
+
+    def code(self, bmi):
+        """Return the index into CATEGORY_INFO of the category a BMI falls in"""
+        return bisect_right(self.thresholds, bmi)
+
+    def categorize(self, bmi):
+        """Return the (name, color) pair of the category a BMI falls in"""
+        return CATEGORIES[bisect_right(self.thresholds, bmi)]
+
+    def references(self):
+        """Return (label, range text, color) for every category, for reference tables"""
+        bounds = (None,) + self.thresholds + (None,)
+        rows = []
+        for category, low, high in zip(CATEGORY_INFO, bounds, bounds[1:]):
+            if low is None:
+                text = f"< {high:g}"
+            elif high is None:
+                text = f"≥ {low:g}"
+            else:
+                text = f"{low:g} - {high - 0.1:g}"
+            rows.append((category.label, text, category.swatch))
+        return rows
+
+    def threshold_lines(self):
+        """Return (bmi, color, label) for each cutoff, labelled with the category below it"""
+        return [(threshold, category.swatch, category.label)
+                for threshold, category in zip(self.thresholds, CATEGORY_INFO)]
+
+
+SCHEMES = {
+    "who": CategoryScheme("who", "WHO", (18.5, 25, 30)),
+    # WHO expert consultation cutoffs for Asian populations
+    "asian": CategoryScheme("asian", "Asian", (18.5, 23, 27.5)),
+}
+
+
+def get_scheme(name):
+    """Return the registered scheme with this name"""
+    try:
+        return SCHEMES[name]
+    except KeyError:
+        raise ValueError(f"Unknown BMI scheme: {name}")
+
+
+SCHEME = get_scheme(os.environ.get("BMI_SCHEME", "who"))
+THRESHOLDS = SCHEME.thresholds
+# Upper limits accepted by validate_measurement, in kg and cm
+MAX_WEIGHT = 500
+MAX_HEIGHT = 300
+
+
+def calculate_bmi(weight, height):
+    """Calculate BMI from weight (kg) and height (cm)"""
+    height_m = height / 100
+    return weight / (height_m ** 2)
+
+
+def categorize_bmi(bmi):
+    """Categorize BMI value"""
+    return SCHEME.categorize(bmi)
+
+
+def format_result(bmi):
+    """Return the result text shown for a BMI: value, category and advice"""
+    return _format_result(round(bmi, 2), SCHEME.code(bmi))
+
+
+@lru_cache(maxsize=4096)
+def _format_result(bmi, code):
+    # Keyed on the rounded BMI, so repeated measurements share one string
+    category = CATEGORY_INFO[code]
+    return f"BMI: {bmi:.2f}\n\nCategory: {category.name}\n\n{category.advice}"
+
+
+def validate_measurement(username, weight, height):
+    """Check raw inputs and return (weight, height) as floats
+
+    Raises ValueError with a user-facing message when an input is invalid.
+    """
+    if not str(username).strip():
+        raise ValueError("Please enter a username")
+
+    try:
+        weight = float(weight)
+    except (TypeError, ValueError):
+        raise ValueError("Please enter a valid weight")
+    if not 0 < weight <= MAX_WEIGHT:
+        raise ValueError(f"Weight must be between 0 and {MAX_WEIGHT} kg")
+
+    try:
+        height = float(height)
+    except (TypeError, ValueError):
+        raise ValueError("Please enter a valid height")
+    if not 0 < height <= MAX_HEIGHT:
+        raise ValueError(f"Height must be between 0 and {MAX_HEIGHT} cm")
+
+    return weight, height
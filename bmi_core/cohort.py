@@ -0,0 +1,232 @@
+"""Population-level BMI statistics computed across processes
+
+Users are split into shards. Each shard is summarized in a worker process into
+a CohortStats partial made of counts and fixed-bin histograms, and the partials
+are merged. Histograms merge exactly, so the result does not depend on how
+users were sharded, and percentiles are accurate to one bin width.
+
+Stores that other processes can open read-only (an SQLite database on disk)
+are read by the workers themselves, so only user names are sent to them and
+what they see is what has been committed. Histories from other stores are
+copied by this process and sent along with the shard.
+
+Usage: python -m bmi_core.cohort [--store binary] [--workers 8]
+"""
+import argparse
+import json
+import os
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import nullcontext
+
+from .bmi import CATEGORY_NAMES, THRESHOLDS
+from .columnar import UserHistory, date_to_seconds
+from .parallel import bounded_map
+
+WINDOWS_DAYS = (30, 90, 365)
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class BinnedHistogram:
+    """Fixed-width bins over [low, high) plus under/overflow counts"""
+
+    def __init__(self, low, high, step):
+        self.low = low
+        self.step = step
+        self.counts = [0] * int(round((high - low) / step))
+        self.under = 0
+        self.over = 0
+
+    @property
+    def total(self):
+        return sum(self.counts) + self.under + self.over
+
+    def add(self, value):
+        i = int((value - self.low) // self.step)
+        if i < 0:
+            self.under += 1
+        elif i >= len(self.counts):
+            self.over += 1
+        else:
+            self.counts[i] += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.under += other.under
+        self.over += other.over
+
+    def percentile(self, q):
+        """Midpoint of the bin holding the q-th percentile, or None if empty"""
+        total = self.total
+        if not total:
+            return None
+        target = q / 100 * total
+        seen = self.under
+        if seen >= target and self.under:
+            return self.low
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return self.low + (i + 0.5) * self.step
+        return self.low + len(self.counts) * self.step
+
+
+class CohortStats:
+    """Mergeable summary of many users' histories"""
+
+    def __init__(self):
+        self.users = 0
+        self.entries = 0
+        self.category_counts = [0] * len(CATEGORY_NAMES)
+        self.latest_category_counts = [0] * len(CATEGORY_NAMES)
+        self.bmi = BinnedHistogram(10, 70, 0.1)
+        self.latest_bmi = BinnedHistogram(10, 70, 0.1)
+        self.weight_change = {days: BinnedHistogram(-50, 50, 0.5) for days in WINDOWS_DAYS}
+
+    def add_user(self, dates, weights, bmis):
+        """Fold in one user's columns; dates are epoch seconds in ascending order"""
+        if not bmis:
+            return
+        self.users += 1
+        self.entries += len(bmis)
+        for bmi in bmis:
+            self.category_counts[bisect_right(THRESHOLDS, bmi)] += 1
+            self.bmi.add(bmi)
+        self.latest_category_counts[bisect_right(THRESHOLDS, bmis[-1])] += 1
+        self.latest_bmi.add(bmis[-1])
+
+        last = dates[-1]
+        for days, histogram in self.weight_change.items():
+            first = bisect_left(dates, last - days * 86400)
+            if first < len(dates) - 1:
+                histogram.add(weights[-1] - weights[first])
+
+    def merge(self, other):
+        self.users += other.users
+        self.entries += other.entries
+        self.category_counts = [a + b for a, b in zip(self.category_counts, other.category_counts)]
+        self.latest_category_counts = [a + b for a, b in
+                                       zip(self.latest_category_counts, other.latest_category_counts)]
+        self.bmi.merge(other.bmi)
+        self.latest_bmi.merge(other.latest_bmi)
+        for days, histogram in self.weight_change.items():
+            histogram.merge(other.weight_change[days])
+        return self
+
+    def summary(self):
+        """Return the headline numbers as plain dicts"""
+        def percentiles(histogram):
+            values = ((q, histogram.percentile(q)) for q in PERCENTILES)
+            return {f"p{q}": None if value is None else round(value, 2) for q, value in values}
+
+        return {
+            "users": self.users,
+            "entries": self.entries,
+            "categories": dict(zip(CATEGORY_NAMES, self.category_counts)),
+            "latest_categories": dict(zip(CATEGORY_NAMES, self.latest_category_counts)),
+            "bmi_percentiles": percentiles(self.bmi),
+            "latest_bmi_percentiles": percentiles(self.latest_bmi),
+            "weight_change": {
+                f"{days}d": dict(users=histogram.total, **percentiles(histogram))
+                for days, histogram in self.weight_change.items()
+            },
+        }
+
+
+def history_columns(history):
+    """Copy a history into (dates, weights, bmis) arrays, skipping entries without a usable date"""
+    if isinstance(history, UserHistory):
+        history = history.copy()
+        history.compact()
+        return history.dates, history.weights, history.bmis
+    dates, weights, bmis = array('q'), array('d'), array('d')
+    for entry in history:
+        try:
+            seconds = date_to_seconds(entry['date'])
+            weight, bmi = float(entry['weight']), float(entry['bmi'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        dates.append(seconds)
+        weights.append(weight)
+        bmis.append(bmi)
+    return dates, weights, bmis
+
+
+def summarize_shard(shard):
+    """Summarize a list of (dates, weights, bmis) columns; runs in a worker process"""
+    stats = CohortStats()
+    for dates, weights, bmis in shard:
+        stats.add_user(dates, weights, bmis)
+    return stats
+
+
+def summarize_users(store, usernames):
+    """Open a read-only copy of a store and summarize the given users; runs in a worker process"""
+    store.load(readonly=True)
+    try:
+        return summarize_shard(history_columns(store.history(username)) for username in usernames)
+    finally:
+        store.close()
+
+
+def iter_shards(store, shard_size):
+    """Yield lists of history columns, `shard_size` users at a time"""
+    lock = getattr(store, 'lock', None) or nullcontext()
+    shard = []
+    for username in store.users():
+        # Copy under the lock so GUI-thread edits cannot change a history mid-read
+        with lock:
+            shard.append(history_columns(store.history(username)))
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def iter_tasks(store, shard_size):
+    """Yield (function, args) that summarize `shard_size` users at a time in a worker"""
+    readonly_copy = getattr(store, 'readonly_copy', None)
+    copy = readonly_copy() if readonly_copy is not None else None
+    if copy is None:
+        for shard in iter_shards(store, shard_size):
+            yield summarize_shard, (shard,)
+        return
+    users = store.users()
+    for start in range(0, len(users), shard_size):
+        yield summarize_users, (copy, users[start:start + shard_size])
+
+
+def analyze(store, workers=None, shard_size=500):
+    """Compute CohortStats over every user in the store using `workers` processes"""
+    workers = workers or os.cpu_count() or 1
+    result = CohortStats()
+    for partial in bounded_map(iter_tasks(store, shard_size), workers):
+        result.merge(partial)
+    return result
+
+
+def main(argv=None):
+    from .storage import open_store
+
+    parser = argparse.ArgumentParser(description="Summarize BMI statistics across all users")
+    parser.add_argument("--data-file", default="bmi_data.json", help="data file the store is based on")
+    parser.add_argument("--store", help="storage backend (default: BMI_STORE or journal)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--shard-size", type=int, default=500, help="users per shard")
+    args = parser.parse_args(argv)
+
+    store = open_store(args.data_file, args.store)
+    # Compacting here would replace the journal under a window still appending to it
+    store.load(readonly=True)
+    try:
+        stats = analyze(store, args.workers, args.shard_size)
+    finally:
+        store.close()
+    print(json.dumps(stats.summary(), indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
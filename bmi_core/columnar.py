@@ -0,0 +1,278 @@
+"""Compact column-per-field storage for a user's history
+
+A list of entry dicts costs several hundred bytes per measurement. UserHistory
+keeps each field in a typed array instead (about 43 bytes per entry) and builds
+the familiar dicts only when an entry is read.
+
+Entries are kept in date order; an older entry is inserted where it belongs
+rather than appended.
+
+Every entry has a stable id, 16 hex digits. Deleting by id marks the entry as
+a tombstone in O(1). Iteration, indexing and slicing walk past tombstones.
+compact() drops them, and the stores only run it, off the store lock, once
+they make up PURGE_FRACTION of the columns.
+"""
+import hashlib
+import secrets
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from .bmi import CATEGORY_NAMES
+
+EPOCH = datetime(1970, 1, 1)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+FIELDS = ("id", "date", "weight", "height", "bmi", "category")
+COLUMNS = ("ids", "dates", "weights", "heights", "bmis", "categories")
+TOMBSTONE = 255
+# Deleted entries are left as tombstones until they make up this share of the columns
+PURGE_FRACTION = 0.25
+_CATEGORY_CODES = {name: code for code, name in enumerate(CATEGORY_NAMES)}
+
+
+def new_entry_id():
+    """Return a random id for a new entry"""
+    return f"{secrets.randbits(64):016x}"
+
+
+def legacy_entry_id(username, position, date):
+    """Return the id for an entry saved before entries had ids
+
+    It depends only on where the entry sits in the user's history, so every
+    instance that migrates the same file derives the same ids.
+    """
+    key = f"{username}\0{position}\0{date}".encode()
+    return hashlib.blake2b(key, digest_size=8).hexdigest()
+
+
+def assign_missing_ids(username, entries):
+    """Give entries without an id their legacy id; returns how many were assigned"""
+    assigned = 0
+    for position, entry in enumerate(entries):
+        if isinstance(entry, dict) and 'id' not in entry:
+            entry['id'] = legacy_entry_id(username, position, entry.get('date'))
+            assigned += 1
+    return assigned
+
+
+def insert_by_date(entries, entry):
+    """Insert an entry into a list kept in date order; returns whether it went at the end
+
+    For histories that do not fit UserHistory. Entries without a date go at the end.
+    """
+    date = entry.get('date') if isinstance(entry, dict) else None
+    if not isinstance(date, str) or not entries or _entry_date(entries[-1]) <= date:
+        entries.append(entry)
+        return True
+    entries.insert(bisect_right([_entry_date(e) for e in entries], date), entry)
+    return False
+
+
+def _entry_date(entry):
+    date = entry.get('date') if isinstance(entry, dict) else None
+    return date if isinstance(date, str) else ""
+
+
+def date_to_seconds(date):
+    """Convert a 'YYYY-MM-DD HH:MM:SS' string to whole seconds since 1970"""
+    return (datetime.fromisoformat(date) - EPOCH) // timedelta(seconds=1)
+
+
+def seconds_to_date(seconds):
+    """Convert seconds since 1970 back to a 'YYYY-MM-DD HH:MM:SS' string"""
+    return (EPOCH + timedelta(seconds=seconds)).strftime(DATE_FORMAT)
+
+
+class UserHistory:
+    """Sequence of entry dicts backed by one typed array per field"""
+
+    def __init__(self):
+        self.ids = array('Q')
+        self.dates = array('q')
+        self.weights = array('d')
+        self.heights = array('d')
+        self.bmis = array('d')
+        self.categories = array('B')
+        self.removed = 0
+        # id -> position, built on the first delete and kept up to date after that
+        self._positions = None
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Pack a list of entries, or return it unchanged if any entry does not fit the columns"""
+        history = cls()
+        try:
+            for entry in entries:
+                history.append(entry)
+        except ValueError:
+            return entries
+        return history
+
+    def append(self, entry):
+        """Add an entry dict in date order; raises ValueError if it cannot be stored without loss
+
+        Returns whether it went after every other entry. An older entry is
+        inserted after the entries dated no later than it.
+        """
+        if not isinstance(entry, dict) or entry.keys() != set(FIELDS):
+            raise ValueError("Entry does not match the columnar layout")
+        try:
+            entry_id = int(entry['id'], 16)
+            seconds = date_to_seconds(entry['date'])
+            code = _CATEGORY_CODES[entry['category']]
+            values = (float(entry['weight']), float(entry['height']), float(entry['bmi']))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Entry does not match the columnar layout")
+        if f"{entry_id:016x}" != entry['id'] or seconds_to_date(seconds) != entry['date']:
+            raise ValueError("Entry does not match the columnar layout")
+
+        if self.dates and seconds < self.dates[-1]:
+            # Tombstones keep their dates, so the column stays sorted with them in it
+            i = bisect_right(self.dates, seconds)
+            for name, value in zip(COLUMNS, (entry_id, seconds) + values + (code,)):
+                getattr(self, name).insert(i, value)
+            # Every later position moved; rebuilt on the next delete
+            self._positions = None
+            return False
+
+        if self._positions is not None:
+            self._positions[entry_id] = len(self.ids)
+        self.ids.append(entry_id)
+        self.dates.append(seconds)
+        self.weights.append(values[0])
+        self.heights.append(values[1])
+        self.bmis.append(values[2])
+        self.categories.append(code)
+        return True
+
+    def index_ids(self):
+        """Build the id -> position index now rather than on the first delete"""
+        if self.removed:
+            self._positions = {value: i for i, value in enumerate(self.ids)
+                               if self.categories[i] != TOMBSTONE}
+        else:
+            self._positions = dict(zip(self.ids, range(len(self.ids))))
+
+    def position(self, entry_id):
+        """Return the column position of the entry with this id, or None"""
+        if self._positions is None:
+            self.index_ids()
+        try:
+            return self._positions.get(int(entry_id, 16))
+        except (TypeError, ValueError):
+            return None
+
+    def remove_id(self, entry_id):
+        """Mark the entry with this id as deleted; returns whether it was found"""
+        i = self.position(entry_id)
+        if i is None:
+            return False
+        del self._positions[self.ids[i]]
+        self.categories[i] = TOMBSTONE
+        self.removed += 1
+        return True
+
+    def needs_purge(self):
+        """Whether enough entries were deleted to be worth compacting"""
+        return self.removed > len(self.dates) * PURGE_FRACTION
+
+    def compact(self):
+        """Drop deleted entries from the columns, keeping the id index up to date if there is one"""
+        if not self.removed:
+            return
+        # Copy the runs of live entries between tombstones a slice at a time
+        codes = self.categories.tobytes()
+        runs, start = [], 0
+        while start <= len(codes):
+            end = codes.find(bytes([TOMBSTONE]), start)
+            if end < 0:
+                end = len(codes)
+            if end > start:
+                runs.append((start, end))
+            start = end + 1
+        for name in COLUMNS:
+            column = getattr(self, name)
+            packed = array(column.typecode)
+            for start, end in runs:
+                packed += column[start:end]
+            setattr(self, name, packed)
+        self.removed = 0
+        if self._positions is not None:
+            self.index_ids()
+
+    def entry(self, i):
+        """Build the dict for the entry at column position i"""
+        return {
+            "id": f"{self.ids[i]:016x}",
+            "date": seconds_to_date(self.dates[i]),
+            "weight": self.weights[i],
+            "height": self.heights[i],
+            "bmi": self.bmis[i],
+            "category": CATEGORY_NAMES[self.categories[i]],
+        }
+
+    def __len__(self):
+        return len(self.dates) - self.removed
+
+    def _column_positions(self, start, stop):
+        """Column positions of live entries start to stop - 1, found by walking in from the nearer end"""
+        if not self.removed:
+            return range(start, stop)
+        codes = self.categories
+        positions = []
+        if start < len(self) - stop:
+            seen = 0
+            for i, code in enumerate(codes):
+                if code != TOMBSTONE:
+                    if seen >= stop:
+                        break
+                    if seen >= start:
+                        positions.append(i)
+                    seen += 1
+        else:
+            seen = len(self)
+            for i in range(len(codes) - 1, -1, -1):
+                if codes[i] != TOMBSTONE:
+                    seen -= 1
+                    if seen < start:
+                        break
+                    if seen < stop:
+                        positions.append(i)
+            positions.reverse()
+        return positions
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            wanted = range(*index.indices(len(self)))
+            if not wanted:
+                return []
+            first = min(wanted[0], wanted[-1])
+            positions = self._column_positions(first, max(wanted[0], wanted[-1]) + 1)
+            return [self.entry(positions[i - first]) for i in wanted]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self.entry(self._column_positions(index, index + 1)[0])
+
+    def __iter__(self):
+        for i in range(len(self.dates)):
+            if self.categories[i] != TOMBSTONE:
+                yield self.entry(i)
+
+    def __reversed__(self):
+        for i in range(len(self.dates) - 1, -1, -1):
+            if self.categories[i] != TOMBSTONE:
+                yield self.entry(i)
+
+    def copy(self):
+        """Return an independent copy of the columns, tombstones included"""
+        other = UserHistory()
+        for name in COLUMNS:
+            setattr(other, name, getattr(self, name)[:])
+        other.removed = self.removed
+        return other
+
+    def to_list(self):
+        """Return the history as a plain list of dicts"""
+        return list(self)
@@ -0,0 +1,27 @@
+"""Reduce long series to roughly one point per pixel before plotting"""
+
+
+def minmax_downsample(xs, ys, max_points):
+    """Keep the lowest and highest point of each bucket so spikes survive
+
+    Returns at most `max_points` points (plus the first and last), in order.
+    """
+    n = len(ys)
+    if n <= max_points or max_points < 4:
+        return list(xs), list(ys)
+
+    buckets = max_points // 2
+    out_x, out_y = [], []
+    for b in range(buckets):
+        start = b * n // buckets
+        end = (b + 1) * n // buckets
+        indexes = range(start, end)
+        picks = {min(indexes, key=ys.__getitem__), max(indexes, key=ys.__getitem__)}
+        if b == 0:
+            picks.add(0)
+        if b == buckets - 1:
+            picks.add(n - 1)
+        for i in sorted(picks):
+            out_x.append(xs[i])
+            out_y.append(ys[i])
+    return out_x, out_y
@@ -0,0 +1,169 @@
+"""Bulk-import measurements from CSV or JSONL files
+
+Rows are streamed through parse -> validate -> score -> write stages built from
+generators, so the pipeline holds one batch at a time however large the input
+is. The journal, JSON and binary stores keep every history in memory, though;
+import into --store sqlite to keep memory use flat.
+
+Usage: python -m bmi_core.importer measurements.csv [more files...]
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+
+from .batch import score_batch
+from .bmi import CATEGORY_NAMES, validate_measurement
+from .columnar import DATE_FORMAT
+from .storage import open_store
+
+
+def guess_format(path):
+    """Return "jsonl" for .jsonl/.ndjson paths and "csv" for anything else"""
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def parse_records(f, file_format):
+    """Yield (line number, record dict) pairs from an open CSV or JSONL stream; None marks a malformed record"""
+    if file_format == "csv":
+        # Line 1 is the header row
+        for line_no, row in enumerate(csv.DictReader(f), start=2):
+            yield line_no, row
+    else:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_no, record if isinstance(record, dict) else None
+
+
+def read_records(path, file_format=None):
+    """Yield (line number, record dict) pairs from a CSV or JSONL file"""
+    with open(path, 'r', newline='') as f:
+        yield from parse_records(f, file_format or guess_format(path))
+
+
+def validate_records(records, rejected):
+    """Yield (username, date, weight, height) for valid records, reporting the rest to `rejected`"""
+    for line_no, record in records:
+        if record is None:
+            rejected(line_no, "Malformed record")
+            continue
+        username = record.get('username', record.get('user'))
+        # JSONL can carry numbers here; history is keyed by strings
+        username = '' if username is None else str(username)
+        try:
+            weight, height = validate_measurement(username, record.get('weight'),
+                                                  record.get('height'))
+            date = normalize_date(record.get('date'))
+        except ValueError as e:
+            rejected(line_no, str(e))
+            continue
+        yield username, date, weight, height
+
+
+def normalize_date(date):
+    """Return an ISO date or date-time as 'YYYY-MM-DD HH:MM:SS'; a missing date means now"""
+    if date is None or date == '':
+        return datetime.now().strftime(DATE_FORMAT)
+    try:
+        return datetime.fromisoformat(str(date)).strftime(DATE_FORMAT)
+    except ValueError:
+        raise ValueError(f"Invalid date {date!r}; expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+
+def chunked(rows, size):
+    """Group an iterable into lists of at most `size` items"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def score_chunks(chunks):
+    """Attach BMI and category to every row of each chunk"""
+    for chunk in chunks:
+        bmis, codes = score_batch([row[2] for row in chunk], [row[3] for row in chunk])
+        yield [
+            (username, {
+                "date": date,
+                "weight": weight,
+                "height": height,
+                "bmi": round(float(bmi), 2),
+                "category": CATEGORY_NAMES[code],
+            })
+            for (username, date, weight, height), bmi, code in zip(chunk, bmis, codes)
+        ]
+
+
+def import_files(store, paths, batch_size=5000, file_format=None, rejected=None):
+    """Import every file into the store and return (imported, rejected) counts
+
+    Each batch is flushed as it is written, and stores with a journal are
+    compacted once, at the end. Rows may come in any order; the store files
+    each one under its date.
+    """
+    counts = {"imported": 0, "rejected": 0}
+
+    def reject(line_no, reason):
+        counts["rejected"] += 1
+        if rejected is not None:
+            rejected(path, line_no, reason)
+
+    for path in paths:
+        rows = validate_records(read_records(path, file_format), reject)
+        for chunk in score_chunks(chunked(rows, batch_size)):
+            # Oldest first, so each user's rows are mostly appended rather than inserted
+            chunk.sort(key=lambda row: row[1]['date'])
+            for username, entry in chunk:
+                store.append(username, entry)
+            store.flush()
+            counts["imported"] += len(chunk)
+    store.commit()
+    # commit() only compacts once compact_every records have built up
+    compact = getattr(store, 'compact', None)
+    if compact is not None:
+        compact()
+    return counts["imported"], counts["rejected"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bulk-import BMI measurements",
+        epilog="Only --store sqlite keeps memory use flat; the other stores hold every history in memory.")
+    parser.add_argument("files", nargs="+", help="CSV or JSONL files with username, weight, height and optional date")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="input format (default: from file extension)")
+    parser.add_argument("--data-file", default="bmi_data.json", help="data file the store is based on")
+    parser.add_argument("--store", help="storage backend (default: BMI_STORE or journal)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows scored and written per batch")
+    args = parser.parse_args(argv)
+
+    def report_rejected(path, line_no, reason):
+        print(f"{path}:{line_no}: {reason}", file=sys.stderr)
+
+    store = open_store(args.data_file, args.store)
+    store.load()
+    start = time.perf_counter()
+    try:
+        imported, rejected = import_files(store, args.files, args.batch_size,
+                                          args.format, report_rejected)
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - start
+
+    rate = (imported + rejected) / elapsed if elapsed else 0
+    print(f"Imported {imported} rows, rejected {rejected} rows "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Latency histograms and call counts for hot paths
+
+Wrap code with `timed("name")`, either as a decorator or a context manager.
+Set BMI_METRICS=0 to turn recording off; decorated functions are then left
+unwrapped, so the cost is nil. Set BMI_PROFILE=path to run cProfile on the
+main thread for the life of the process and write its stats to that path on
+exit.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("BMI_METRICS", "1") != "0"
+BUCKETS = 32
+
+
+class Histogram:
+    """Call count, total, min and max plus power-of-two microsecond buckets"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        # Bucket i holds durations below 2**i microseconds
+        self.buckets = [0] * BUCKETS
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        self.buckets[min(int(seconds * 1e6).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound, in seconds, of the bucket holding the given fraction of calls"""
+        target = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                return min((2 ** i) / 1e6, self.max)
+        return self.max or 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "min_ms": (self.min or 0.0) * 1000,
+            "max_ms": (self.max or 0.0) * 1000,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "buckets_us": {f"<{2 ** i}": count for i, count in enumerate(self.buckets) if count},
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+def record(name, seconds):
+    """Add one measurement for an operation"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.record(seconds)
+
+
+class _Timer:
+    """Context manager and decorator that records how long its body took"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+
+    def __call__(self, fn):
+        name = self.name
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __call__(self, fn):
+        return fn
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(name):
+    """Time a block (`with timed("x"):`) or every call of a function (`@timed("x")`)"""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def snapshot():
+    """Return the metrics of every operation as plain dicts, sorted by name"""
+    with _lock:
+        return {name: _histograms[name].to_dict() for name in sorted(_histograms)}
+
+
+def reset():
+    """Forget all recorded metrics"""
+    with _lock:
+        _histograms.clear()
+
+
+def export_json(path):
+    """Write the current metrics to a JSON file"""
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=4)
+
+
+_profile_path = os.environ.get("BMI_PROFILE")
+if _profile_path:
+    import cProfile
+
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+    @atexit.register
+    def _dump_profile():
+        _profiler.disable()
+        _profiler.dump_stats(_profile_path)
@@ -0,0 +1,29 @@
+"""Run a stream of tasks on worker processes with a bounded number in flight"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+
+def bounded_map(tasks, workers, in_flight=2):
+    """Run each (function, args) task and yield the results in task order
+
+    With more than one worker the tasks run on a process pool, and at most
+    `workers * in_flight` are submitted ahead of the result being read, so
+    memory stays flat however long `tasks` is. Workers are spawned rather than
+    forked, so functions and arguments must be importable and picklable. With
+    one worker they run in this process.
+    """
+    if workers <= 1:
+        for fn, args in tasks:
+            yield fn(*args)
+        return
+
+    # Forking a process with other threads (the GUI's) can copy a lock one of them holds
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        pending = deque()
+        for fn, args in tasks:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= workers * in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
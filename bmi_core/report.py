@@ -0,0 +1,218 @@
+"""Render every user's trend chart and statistics summary to PNG or PDF files
+
+Rendering uses Matplotlib's Agg canvas, so no display is needed. Users are
+split into shards and rendered in worker processes. Each worker builds one
+figure and redraws it for every user, which avoids rebuilding the axes each
+time. A content hash of each user's history is kept in a cache file in the
+output directory, and users whose data has not changed since the last run
+are skipped.
+
+Usage: python -m bmi_core.report reports/ [--format png pdf] [--workers 8] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from contextlib import nullcontext
+
+from .bmi import SCHEME
+from .cohort import history_columns
+from .columnar import EPOCH
+from .downsample import minmax_downsample
+from .parallel import bounded_map
+
+CACHE_FILE = ".report-cache.json"
+FORMATS = ("png", "pdf")
+# Bump when the report layout changes so every report is rendered again
+REPORT_VERSION = 1
+
+_chart = None
+
+
+def report_name(username):
+    """File name stem for a user's report, safe on every platform"""
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", username).strip(".") or "_"
+    if safe != username:
+        # Keep names that only differ in replaced characters apart
+        safe += "-" + hashlib.blake2b(username.encode("utf-8"), digest_size=4).hexdigest()
+    return safe
+
+
+def content_hash(username, columns, stats):
+    """Hash of everything a user's report is drawn from"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([REPORT_VERSION, SCHEME.name, username, stats.to_dict()]).encode("utf-8"))
+    for column in columns:
+        digest.update(column.tobytes())
+    return digest.hexdigest()
+
+
+def summary_text(stats):
+    """Statistics block printed under the chart"""
+    if not stats.count:
+        return "No entries"
+    return (f"Total Entries: {stats.count}    Latest BMI: {stats.latest_bmi:.2f}    "
+            f"Average BMI: {stats.avg_bmi:.2f}\n"
+            f"Lowest BMI: {stats.bmi_min:.2f}    Highest BMI: {stats.bmi_max:.2f}\n"
+            f"Average Weight: {stats.avg_weight:.2f} kg    "
+            f"Weight Change: {stats.weight_change:+.2f} kg")
+
+
+class ReportChart:
+    """One Agg figure with a trend line and summary text, redrawn for each user"""
+
+    def __init__(self):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.dates import AutoDateLocator, ConciseDateFormatter, date2num
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize=(8, 5), dpi=100)
+        FigureCanvasAgg(self.figure)
+        self.epoch = date2num(EPOCH)
+
+        ax = self.figure.add_axes((0.08, 0.3, 0.88, 0.6))
+        self.line, = ax.plot([], [], marker='o', linewidth=2, markersize=6, color="#3498db")
+        for threshold, color, label in SCHEME.threshold_lines():
+            ax.axhline(y=threshold, color=color, linestyle='--', alpha=0.5, label=label)
+        ax.set_xlabel('Date', fontsize=10)
+        ax.set_ylabel('BMI', fontsize=10)
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best', fontsize=8)
+        locator = AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+        self.axes = ax
+        self.title = ax.set_title('', fontsize=12, fontweight='bold')
+        self.summary = self.figure.text(0.08, 0.04, '', fontsize=9, family='monospace',
+                                        verticalalignment='bottom')
+
+    def render(self, username, columns, stats, paths):
+        """Draw one user's report and save it to each path"""
+        dates, _, bmis = columns
+        days = [self.epoch + seconds / 86400 for seconds in dates]
+        # About one point per horizontal pixel of the 800px-wide figure
+        days, bmis = minmax_downsample(days, list(bmis), 800)
+
+        self.line.set_data(days, bmis)
+        self.line.set_marker('o' if len(bmis) <= 100 else '')
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.title.set_text(f'BMI Trend Over Time: {username}')
+        self.summary.set_text(summary_text(stats))
+        for path in paths:
+            self.figure.savefig(path)
+
+
+def render_shard(shard):
+    """Render a list of (username, columns, stats, paths) jobs; runs in a worker process"""
+    global _chart
+    if _chart is None:
+        _chart = ReportChart()
+    for username, columns, stats, paths in shard:
+        _chart.render(username, columns, stats, paths)
+    return len(shard)
+
+
+def load_cache(out_dir):
+    try:
+        with open(os.path.join(out_dir, CACHE_FILE), 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_cache(out_dir, cache):
+    path = os.path.join(out_dir, CACHE_FILE)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(cache, f)
+    os.replace(path + ".tmp", path)
+
+
+def iter_shards(store, out_dir, formats, cache, force, shard_size, skipped):
+    """Yield lists of render jobs for changed users, recording their new hashes in `cache`"""
+    lock = getattr(store, 'lock', None) or nullcontext()
+    shard = []
+    for username in store.users():
+        # Read both together so the hash describes exactly what is drawn
+        with lock:
+            columns = history_columns(store.history(username))
+            stats = store.stats(username)
+        digest = content_hash(username, columns, stats)
+        paths = [os.path.join(out_dir, f"{report_name(username)}.{ext}") for ext in formats]
+        if not force and cache.get(username) == digest and all(map(os.path.exists, paths)):
+            skipped(username)
+            continue
+        cache[username] = digest
+        shard.append((username, columns, stats, paths))
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def generate_reports(store, out_dir, formats=("png",), workers=None, shard_size=20, force=False):
+    """Render reports for every changed user and return (rendered, skipped) counts"""
+    for ext in formats:
+        if ext not in FORMATS:
+            raise ValueError(f"Unknown report format: {ext}")
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    old_cache = load_cache(out_dir)
+    cache = dict(old_cache)
+    counts = {"rendered": 0, "skipped": 0}
+
+    def skipped(username):
+        counts["skipped"] += 1
+
+    shards = iter_shards(store, out_dir, formats, cache, force, shard_size, skipped)
+    try:
+        tasks = ((render_shard, (shard,)) for shard in shards)
+        for rendered in bounded_map(tasks, workers):
+            counts["rendered"] += rendered
+    except BaseException:
+        # Hashes of users that may not have been written must not mark them up to date
+        cache = old_cache
+        raise
+    finally:
+        users = set(store.users())
+        save_cache(out_dir, {username: digest for username, digest in cache.items()
+                             if username in users})
+    return counts["rendered"], counts["skipped"]
+
+
+def main(argv=None):
+    from .storage import open_store
+
+    parser = argparse.ArgumentParser(description="Render per-user BMI trend reports")
+    parser.add_argument("out_dir", help="directory the reports are written to")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=["png"], dest="formats",
+                        help="file formats to write (default: png)")
+    parser.add_argument("--data-file", default="bmi_data.json", help="data file the store is based on")
+    parser.add_argument("--store", help="storage backend (default: BMI_STORE or journal)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--shard-size", type=int, default=20, help="users rendered per task")
+    parser.add_argument("--force", action="store_true", help="render every user, changed or not")
+    args = parser.parse_args(argv)
+
+    store = open_store(args.data_file, args.store)
+    # A scheduled report must leave the data files exactly as it found them
+    store.load(readonly=True)
+    start = time.perf_counter()
+    try:
+        rendered, skipped = generate_reports(store, args.out_dir, args.formats, args.workers,
+                                             args.shard_size, args.force)
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Rendered {rendered} reports, skipped {skipped} unchanged in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
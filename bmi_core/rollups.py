@@ -0,0 +1,160 @@
+"""Daily, weekly and monthly summaries of a user's history, kept up to date on write
+
+Range and trend queries read these buckets instead of the raw entries, so they
+cost time proportional to the number of buckets in the range.
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import date as Date, timedelta
+
+GRANULARITIES = ("daily", "weekly", "monthly")
+
+
+def is_day(value):
+    """Whether value is a date written exactly as 'YYYY-MM-DD', as range queries take them"""
+    try:
+        return Date.fromisoformat(value).isoformat() == value
+    except (TypeError, ValueError):
+        return False
+
+
+def bucket_key(date, granularity):
+    """Return the bucket a 'YYYY-MM-DD[ HH:MM:SS]' date falls in
+
+    Daily and weekly keys are the bucket's first day ('YYYY-MM-DD', weeks start
+    on Monday); monthly keys are 'YYYY-MM'.
+    """
+    if granularity == "daily":
+        return date[:10]
+    if granularity == "monthly":
+        return date[:7]
+    day = Date.fromisoformat(date[:10])
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+class Bucket:
+    """Count, sum, min and max of BMI and weight for one period"""
+
+    __slots__ = ("count", "bmi_sum", "bmi_min", "bmi_max",
+                 "weight_sum", "weight_min", "weight_max", "first_weight", "last_weight")
+
+    def __init__(self):
+        self.count = 0
+        self.bmi_sum = 0.0
+        self.bmi_min = None
+        self.bmi_max = None
+        self.weight_sum = 0.0
+        self.weight_min = None
+        self.weight_max = None
+        self.first_weight = None
+        self.last_weight = None
+
+    def add(self, bmi, weight):
+        self.count += 1
+        self.bmi_sum += bmi
+        self.bmi_min = bmi if self.bmi_min is None else min(self.bmi_min, bmi)
+        self.bmi_max = bmi if self.bmi_max is None else max(self.bmi_max, bmi)
+        self.weight_sum += weight
+        self.weight_min = weight if self.weight_min is None else min(self.weight_min, weight)
+        self.weight_max = weight if self.weight_max is None else max(self.weight_max, weight)
+        if self.first_weight is None:
+            self.first_weight = weight
+        self.last_weight = weight
+
+    @property
+    def bmi_mean(self):
+        return self.bmi_sum / self.count
+
+    @property
+    def weight_mean(self):
+        return self.weight_sum / self.count
+
+    def to_list(self):
+        return [getattr(self, field) for field in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        bucket = cls()
+        for field, value in zip(cls.__slots__, values):
+            setattr(bucket, field, value)
+        return bucket
+
+
+class Rollups:
+    """Buckets for every granularity, with sorted keys for range lookups"""
+
+    def __init__(self):
+        self.buckets = {granularity: {} for granularity in GRANULARITIES}
+        self.keys = {granularity: [] for granularity in GRANULARITIES}
+
+    @classmethod
+    def from_history(cls, history):
+        rollups = cls()
+        for entry in history:
+            rollups.add(entry)
+        return rollups
+
+    def add(self, entry):
+        """Fold one entry into its daily, weekly and monthly buckets"""
+        try:
+            date, bmi, weight = entry['date'], entry['bmi'], entry['weight']
+            keys = [(granularity, bucket_key(date, granularity)) for granularity in GRANULARITIES]
+        except (KeyError, TypeError, ValueError):
+            return
+        for granularity, key in keys:
+            self._bucket(granularity, key).add(bmi, weight)
+
+    def _bucket(self, granularity, key):
+        buckets = self.buckets[granularity]
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = Bucket()
+            keys = self.keys[granularity]
+            # Entries normally arrive in date order, so this is usually an append
+            if not keys or key > keys[-1]:
+                keys.append(key)
+            else:
+                insort(keys, key)
+        return bucket
+
+    def query(self, granularity, start=None, end=None):
+        """Return copies of the (key, Bucket) pairs, oldest first, for buckets overlapping [start, end]"""
+        keys = self.keys[granularity]
+        lo = bisect_left(keys, bucket_key(start, granularity)) if start else 0
+        hi = bisect_right(keys, bucket_key(end, granularity)) if end else len(keys)
+        buckets = self.buckets[granularity]
+        # Copies, so later appends cannot change a result another thread is reading
+        return [(key, Bucket.from_list(buckets[key].to_list())) for key in keys[lo:hi]]
+
+    def to_dict(self):
+        return {granularity: {key: bucket.to_list() for key, bucket in buckets.items()}
+                for granularity, buckets in self.buckets.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        rollups = cls()
+        for granularity in GRANULARITIES:
+            for key, values in data[granularity].items():
+                rollups.buckets[granularity][key] = Bucket.from_list(values)
+            rollups.keys[granularity] = sorted(rollups.buckets[granularity])
+        return rollups
+
+
+def summarize(buckets):
+    """Combine (key, Bucket) pairs into range totals, or None if there are none
+
+    Buckets cover whole periods, so pass daily ones for totals that match the
+    dates asked for.
+    """
+    buckets = [bucket for _, bucket in buckets]
+    if not buckets:
+        return None
+    count = sum(bucket.count for bucket in buckets)
+    return {
+        "count": count,
+        "avg_bmi": sum(bucket.bmi_sum for bucket in buckets) / count,
+        "min_bmi": min(bucket.bmi_min for bucket in buckets),
+        "max_bmi": max(bucket.bmi_max for bucket in buckets),
+        "latest_bmi_mean": buckets[-1].bmi_mean,
+        "avg_weight": sum(bucket.weight_sum for bucket in buckets) / count,
+        "weight_change": buckets[-1].last_weight - buckets[0].first_weight,
+    }
@@ -0,0 +1,150 @@
+"""Score measurements from files or stdin and write the results to stdout
+
+Records are read as CSV or JSONL in chunks. Each valid record gets "bmi" and
+"category" fields and is written back out as CSV or JSONL, one write per
+chunk. With --workers above 1, chunks are scored and formatted in separate
+processes, and the output keeps the input order. Rejected records and a
+throughput summary go to stderr, so stdout can feed a pipeline.
+
+Usage: python -m bmi_core.score [files ...] [--output-format jsonl] [--workers 4]
+       ("-" or no files reads stdin)
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from .batch import score_batch
+from .bmi import CATEGORY_NAMES, validate_measurement
+from .importer import chunked, guess_format, parse_records
+from .parallel import bounded_map
+
+READ_BUFFER = 1 << 20
+SCORE_FIELDS = ("bmi", "category")
+
+
+def score_chunk(chunk, output_format, fieldnames):
+    """Score one chunk of (line number, record) pairs; returns (text, scored count, rejections)"""
+    valid, rejected = [], []
+    for line_no, record in chunk:
+        if record is None:
+            rejected.append((line_no, "Malformed record"))
+            continue
+        try:
+            # Only the measurement is validated; a username is optional here
+            weight, height = validate_measurement('-', record.get('weight'), record.get('height'))
+        except ValueError as e:
+            rejected.append((line_no, str(e)))
+            continue
+        valid.append((record, weight, height))
+
+    out = io.StringIO()
+    if valid:
+        bmis, codes = score_batch([row[1] for row in valid], [row[2] for row in valid])
+        writer = None
+        if output_format == "csv":
+            writer = csv.DictWriter(out, fieldnames, extrasaction='ignore', lineterminator='\n')
+        for (record, weight, height), bmi, code in zip(valid, bmis, codes):
+            record = dict(record, weight=weight, height=height,
+                          bmi=round(float(bmi), 2), category=CATEGORY_NAMES[code])
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                out.write(json.dumps(record) + "\n")
+    return out.getvalue(), len(valid), rejected
+
+
+def read_chunks(paths, input_format, chunk_size):
+    """Yield (path, chunk) pairs from every input, reading "-" as stdin"""
+    for path in paths:
+        if path == "-":
+            yield from ((path, chunk) for chunk in
+                        chunked(parse_records(sys.stdin, input_format or "csv"), chunk_size))
+            continue
+        with open(path, 'r', newline='', buffering=READ_BUFFER) as f:
+            records = parse_records(f, input_format or guess_format(path))
+            yield from ((path, chunk) for chunk in chunked(records, chunk_size))
+
+
+def output_fields(chunk):
+    """CSV columns: the first record's fields followed by bmi and category"""
+    for _, record in chunk:
+        if record is not None:
+            return [name for name in record if name not in SCORE_FIELDS] + list(SCORE_FIELDS)
+    return ["weight", "height"] + list(SCORE_FIELDS)
+
+
+def score_files(paths, out, output_format="csv", input_format=None, chunk_size=10_000,
+                workers=1, rejected=None):
+    """Score every input into `out` and return (scored, rejected) counts"""
+    counts = {"scored": 0, "rejected": 0}
+    chunks = read_chunks(paths, input_format, chunk_size)
+    fieldnames = None
+
+    def write(path, result):
+        text, scored, rejections = result
+        out.write(text)
+        counts["scored"] += scored
+        counts["rejected"] += len(rejections)
+        if rejected is not None:
+            for line_no, reason in rejections:
+                rejected(path, line_no, reason)
+
+    def header(chunk):
+        nonlocal fieldnames
+        if fieldnames is None:
+            fieldnames = output_fields(chunk)
+            if output_format == "csv":
+                csv.writer(out, lineterminator='\n').writerow(fieldnames)
+
+    # Results come back in submission order, so each one matches the oldest path queued
+    paths = deque()
+
+    def tasks():
+        for path, chunk in chunks:
+            header(chunk)
+            paths.append(path)
+            yield score_chunk, (chunk, output_format, fieldnames)
+
+    for result in bounded_map(tasks(), workers):
+        write(paths.popleft(), result)
+    return counts["scored"], counts["rejected"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score BMI measurements from CSV or JSONL")
+    parser.add_argument("files", nargs="*", default=["-"],
+                        help="CSV or JSONL files with weight (kg) and height (cm); - or none reads stdin")
+    parser.add_argument("--input-format", choices=("csv", "jsonl"),
+                        help="input format (default: from file extension, csv for stdin)")
+    parser.add_argument("--output-format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="records scored per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="processes scoring chunks")
+    args = parser.parse_args(argv)
+
+    def report_rejected(path, line_no, reason):
+        print(f"{path}:{line_no}: {reason}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        scored, rejected = score_files(args.files, sys.stdout, args.output_format, args.input_format,
+                                       args.chunk_size, args.workers, report_rejected)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`); stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    elapsed = time.perf_counter() - start
+
+    rate = (scored + rejected) / elapsed if elapsed else 0
+    print(f"Scored {scored} rows, rejected {rejected} rows "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""Local HTTP/JSON API for BMI calculation, history and statistics
+
+Built on asyncio streams with HTTP/1.1 keep-alive. Store calls run on a
+single-thread executor so they never block the event loop. Single
+calculations are answered inline. Batches are range-checked and scored as
+NumPy arrays, a few milliseconds per 10,000 rows; larger ones go to a pool of
+`--workers` threads so the event loop keeps serving other connections.
+Without NumPy every row is checked and scored in Python.
+
+Endpoints:
+
+    POST /bmi                       {"weight": 70, "height": 175}
+    POST /bmi/batch                 {"weights": [...], "heights": [...]}
+    GET  /users                     list of usernames
+    GET  /users/<name>/history      ?start=0&limit=100, newest first
+    POST /users/<name>/history      {"weight": 70, "height": 175}
+    GET  /users/<name>/stats
+    GET  /users/<name>/rollups      ?granularity=monthly&start=YYYY-MM-DD&end=YYYY-MM-DD
+
+Usage: python -m bmi_core.server [--host 127.0.0.1] [--port 8080] [--workers 4]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .batch import load_numpy, score_batch
+from .bmi import (CATEGORY_NAMES, MAX_HEIGHT, MAX_WEIGHT, calculate_bmi, categorize_bmi,
+                  validate_measurement)
+from .rollups import is_day
+from .storage import open_store
+from .worker import CoalescingWriter, LockedStore
+
+MAX_BODY = 16 * 1024 * 1024
+MAX_HEADERS = 100
+INLINE_BATCH_ROWS = 10_000
+
+
+class HTTPError(Exception):
+    """Error answered with the given HTTP status and a JSON message"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class BMIServer:
+    """Routes requests to BMI functions and a store"""
+
+    def __init__(self, store, workers=4):
+        self.store = store
+        # One thread keeps store access serialized; saves are coalesced on another
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bmi-store")
+        self.compute = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bmi-compute")
+        self.writer = CoalescingWriter(store.commit)
+
+    async def run_store(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def score(self, weights, heights):
+        """Validate and score a batch, moving large ones off the event loop"""
+        if len(weights) <= INLINE_BATCH_ROWS:
+            return self.score_rows(weights, heights)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.compute, self.score_rows, weights, heights)
+
+    @staticmethod
+    def score_rows(weights, heights):
+        """Check every row against the same limits as POST /bmi, then score them all"""
+        first = 0
+        np = load_numpy()
+        if np is not None:
+            try:
+                weight_array = np.asarray(weights, dtype=np.float64)
+                height_array = np.asarray(heights, dtype=np.float64)
+            except (TypeError, ValueError):
+                # Some row is not a number; the loop below finds it
+                weight_array = height_array = None
+            if weight_array is not None and weight_array.ndim == height_array.ndim == 1:
+                # NaN fails every comparison, so it is rejected like in validate_measurement
+                valid = ((weight_array > 0) & (weight_array <= MAX_WEIGHT)
+                         & (height_array > 0) & (height_array <= MAX_HEIGHT))
+                if valid.all():
+                    return score_batch(weight_array, height_array)
+                # validate_measurement words the error for the first bad row
+                first = int(valid.argmin())
+
+        valid_weights, valid_heights = [], []
+        for i, (weight, height) in enumerate(zip(weights, heights)):
+            if i < first:
+                continue
+            try:
+                weight, height = validate_measurement('-', weight, height)
+            except ValueError as e:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Row {i}: {e}")
+            valid_weights.append(weight)
+            valid_heights.append(height)
+        return score_batch(valid_weights, valid_heights)
+
+    def known_user(self, fn, username, *args):
+        """Call fn(username, *args) on the store thread, or answer 404 if the user has no history
+
+        stats() and rollups() cache what they build, so asking them about an
+        unknown name would save an empty entry for it.
+        """
+        if not self.store.history_page(username, 0, 1):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No data for {username}")
+        return fn(username, *args)
+
+    async def save(self):
+        """Wait until changes made so far are committed"""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def saved(error):
+            loop.call_soon_threadsafe(done.set_result, error)
+        self.writer.request(saved)
+        error = await done
+        if error is not None:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, f"Failed to save data: {error}")
+
+    async def handle(self, method, path, query, body):
+        """Return the JSON-serializable response for one request"""
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+
+        if parts == ['bmi'] and method == 'POST':
+            weight, height = self.measurement(body)
+            bmi = calculate_bmi(weight, height)
+            return {"bmi": round(bmi, 2), "category": categorize_bmi(bmi)[0]}
+
+        if parts == ['bmi', 'batch'] and method == 'POST':
+            weights, heights = self.batch_lists(body)
+            bmis, codes = await self.score(weights, heights)
+            return {"bmi": [round(float(b), 2) for b in bmis],
+                    "category": [CATEGORY_NAMES[c] for c in codes]}
+
+        if parts == ['users'] and method == 'GET':
+            return await self.run_store(self.store.users)
+
+        if len(parts) == 3 and parts[0] == 'users':
+            username = parts[1]
+            if parts[2] == 'history' and method == 'GET':
+                start = self.int_param(query, 'start', 0)
+                limit = self.int_param(query, 'limit', 100)
+                return await self.run_store(self.store.history_page, username, start, limit)
+            if parts[2] == 'history' and method == 'POST':
+                return await self.add_entry(username, body)
+            if parts[2] == 'stats' and method == 'GET':
+                stats = await self.run_store(self.known_user, self.store.stats, username)
+                if not stats.count:
+                    raise HTTPError(HTTPStatus.NOT_FOUND, f"No data for {username}")
+                result = stats.to_dict()
+                result.update(avg_bmi=stats.avg_bmi, bmi_stdev=stats.bmi_stdev,
+                              avg_weight=stats.avg_weight, weight_change=stats.weight_change)
+                return result
+            if parts[2] == 'rollups' and method == 'GET':
+                return await self.rollups(username, query)
+
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+
+    async def add_entry(self, username, body):
+        if not username.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Please enter a username")
+        weight, height = self.measurement(body)
+        bmi = calculate_bmi(weight, height)
+        entry = {
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "weight": weight,
+            "height": height,
+            "bmi": round(bmi, 2),
+            "category": categorize_bmi(bmi)[0],
+        }
+        await self.run_store(self.store.append, username, entry)
+        await self.save()
+        return entry
+
+    async def rollups(self, username, query):
+        granularity = query.get('granularity', ['monthly'])[0]
+        start, end = query.get('start', [None])[0], query.get('end', [None])[0]
+        for name, value in (('start', start), ('end', end)):
+            if value is not None and not is_day(value):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be a date as YYYY-MM-DD")
+        try:
+            buckets = await self.run_store(self.known_user, self.store.rollups,
+                                           username, granularity, start, end)
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        return [{"period": key, "count": bucket.count,
+                 "bmi_mean": bucket.bmi_mean, "bmi_min": bucket.bmi_min, "bmi_max": bucket.bmi_max,
+                 "weight_mean": bucket.weight_mean, "weight_min": bucket.weight_min,
+                 "weight_max": bucket.weight_max}
+                for key, bucket in buckets]
+
+    @staticmethod
+    def measurement(body):
+        if not isinstance(body, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a JSON object")
+        try:
+            return validate_measurement('-', body.get('weight'), body.get('height'))
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+
+    @staticmethod
+    def batch_lists(body):
+        """Return the weights and heights lists of a batch body"""
+        try:
+            weights, heights = body['weights'], body['heights']
+        except (KeyError, TypeError):
+            weights = heights = None
+        if not isinstance(weights, list) or not isinstance(heights, list):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected 'weights' and 'heights' lists")
+        if len(weights) != len(heights):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'weights' and 'heights' differ in length")
+        return weights, heights
+
+    @staticmethod
+    def int_param(query, name, default):
+        try:
+            return max(int(query.get(name, [default])[0]), 0)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer")
+
+    async def serve_connection(self, reader, writer):
+        """Answer requests on one connection until the client closes it"""
+        try:
+            while True:
+                try:
+                    head = await self.read_head(reader)
+                except HTTPError as e:
+                    # What is left of the head cannot be told apart from the next request
+                    await self.respond(writer, e.status, {"error": str(e)}, False)
+                    break
+                if head is None:
+                    break
+                method, target, version, headers = head
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY:
+                    # The body is left unread, so nothing after it can be parsed as a request
+                    if length < 0:
+                        status, message = HTTPStatus.BAD_REQUEST, "Invalid Content-Length"
+                    else:
+                        status, message = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large"
+                    await self.respond(writer, status, {"error": message}, False)
+                    break
+
+                status, payload = HTTPStatus.OK, None
+                try:
+                    raw = await reader.readexactly(length) if length else b""
+                    try:
+                        body = json.loads(raw) if raw else None
+                    except ValueError:
+                        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid JSON")
+                    url = urlsplit(target)
+                    payload = await self.handle(method, url.path, parse_qs(url.query), body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"}
+
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_head(reader):
+        """Return (method, target, version, headers) of the next request, or None once the client is done
+
+        Raises HTTPError for a request line or header that cannot be read.
+        """
+        try:
+            # The stream raises ValueError for a line longer than its buffer limit
+            request_line = await reader.readline()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Request line too long")
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Bad request line")
+
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header line too long")
+            if line in (b"\r\n", b"\n", b""):
+                return method, target, version, headers
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.compute.shutdown(wait=True)
+        self.writer.stop()
+
+
+async def serve(server, host, port):
+    listener = await asyncio.start_server(server.serve_connection, host, port, reuse_address=True)
+    print(f"Serving on http://{host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve BMI calculation and history over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-file", default="bmi_data.json", help="data file the store is based on")
+    parser.add_argument("--store", help="storage backend (default: BMI_STORE or journal)")
+    parser.add_argument("--workers", type=int, default=4, help="threads for large batch requests")
+    args = parser.parse_args(argv)
+
+    store = LockedStore(open_store(args.data_file, args.store))
+    store.load()
+    server = BMIServer(store, args.workers)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Per-user summary statistics kept up to date as entries are added"""
+import math
+
+
+class RunningStats:
+    """Count, sum, min, max and variance of a user's BMI plus their weight trend
+
+    Adding an entry is O(1); removing one needs a rebuild from the history.
+    """
+
+    FIELDS = ("count", "bmi_sum", "bmi_min", "bmi_max", "bmi_mean", "bmi_m2",
+              "latest_bmi", "weight_sum", "first_weight", "last_weight")
+
+    def __init__(self):
+        self.count = 0
+        self.bmi_sum = 0.0
+        self.bmi_min = None
+        self.bmi_max = None
+        self.bmi_mean = 0.0
+        self.bmi_m2 = 0.0
+        self.latest_bmi = None
+        self.weight_sum = 0.0
+        self.first_weight = None
+        self.last_weight = None
+
+    @classmethod
+    def from_history(cls, history):
+        """Build statistics from a full list of entries"""
+        stats = cls()
+        for entry in history:
+            stats.add(entry)
+        return stats
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for field in cls.FIELDS:
+            setattr(stats, field, data[field])
+        return stats
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def add(self, entry):
+        """Fold one entry into the statistics, skipping incomplete ones"""
+        if not isinstance(entry, dict) or 'bmi' not in entry or 'weight' not in entry:
+            return
+        bmi = entry['bmi']
+        weight = entry['weight']
+
+        self.count += 1
+        self.bmi_sum += bmi
+        self.bmi_min = bmi if self.bmi_min is None else min(self.bmi_min, bmi)
+        self.bmi_max = bmi if self.bmi_max is None else max(self.bmi_max, bmi)
+        # Welford's online update for the variance
+        delta = bmi - self.bmi_mean
+        self.bmi_mean += delta / self.count
+        self.bmi_m2 += delta * (bmi - self.bmi_mean)
+        self.latest_bmi = bmi
+
+        self.weight_sum += weight
+        if self.first_weight is None:
+            self.first_weight = weight
+        self.last_weight = weight
+
+    @property
+    def avg_bmi(self):
+        return self.bmi_sum / self.count
+
+    @property
+    def bmi_stdev(self):
+        return math.sqrt(self.bmi_m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    @property
+    def avg_weight(self):
+        return self.weight_sum / self.count
+
+    @property
+    def weight_change(self):
+        return self.last_weight - self.first_weight if self.count > 1 else 0
@@ -0,0 +1,1041 @@
+"""Storage backends for BMI history data"""
+import json
+import os
+import pathlib
+import shutil
+import sqlite3
+import sys
+import zlib
+
+from .columnar import UserHistory, assign_missing_ids, insert_by_date, new_entry_id
+from .instrument import timed
+from .rollups import GRANULARITIES, Bucket, Rollups, bucket_key
+from .stats import RunningStats
+
+
+def _atomic_write(path, data):
+    """Write bytes to path via a temp file and rename so readers never see a partial file"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _to_json(value):
+    """Serialize compact histories as the plain lists bmi_data.json expects"""
+    if isinstance(value, UserHistory):
+        return value.to_list()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _fingerprint(data):
+    """Identify a snapshot by its length and checksum"""
+    return f"{len(data)}:{zlib.crc32(data):08x}"
+
+
+class JSONStore:
+    """Keeps every user in one JSON file and rewrites it on each commit"""
+
+    def __init__(self, path):
+        self.path = path
+        self.stats_path = os.path.splitext(path)[0] + ".stats.json"
+        self.users_data = {}
+        self.user_stats = {}
+        self.user_rollups = {}
+        self.versions = {}
+        self.migrated = 0
+        self.readonly = False
+
+    @timed("store.load")
+    def load(self, readonly=False):
+        """Load user data from the JSON file
+
+        With `readonly`, nothing is written on load or afterwards, so reports
+        can read the files while another process keeps using them.
+        """
+        self.readonly = readonly
+        self.users_data, base = self._read_snapshot()
+        self._load_stats(base)
+        return self.users_data
+
+    def _load_stats(self, base):
+        """Load cached statistics and rollups saved alongside the snapshot with this fingerprint"""
+        self.user_stats = {}
+        self.user_rollups = {}
+        try:
+            with open(self.stats_path, 'r') as f:
+                saved = json.load(f)
+            if saved.get('base') == base:
+                self.user_stats = {username: RunningStats.from_dict(data)
+                                   for username, data in saved['users'].items()}
+                self.user_rollups = {username: Rollups.from_dict(data)
+                                     for username, data in saved.get('rollups', {}).items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            self.user_stats = {}
+            self.user_rollups = {}
+
+    def _save_snapshot(self):
+        """Write all user data, then the statistics that belong to it; returns the snapshot fingerprint"""
+        base = self._write_files(self._capture(), ".next")
+        self._install(".next")
+        return base
+
+    def _capture(self, copy=False):
+        """Return the histories, statistics and rollups a snapshot is written from
+
+        With copy=True the histories are copied, so the snapshot can be written
+        while other threads keep changing the store.
+        """
+        users_data = self.users_data
+        if copy:
+            users_data = {username: history.copy() if isinstance(history, UserHistory)
+                          else None if history is None else list(history)
+                          for username, history in users_data.items()}
+        stats = {username: stats.to_dict() for username, stats in self.user_stats.items()}
+        rollups = {username: rollups.to_dict() for username, rollups in self.user_rollups.items()}
+        return users_data, stats, rollups
+
+    def _write_files(self, captured, suffix):
+        """Write a captured snapshot and its statistics next to their files; returns the fingerprint"""
+        users_data, stats, rollups = captured
+        base = self._write_snapshot(users_data, self.path + suffix)
+        _atomic_write(self.stats_path + suffix,
+                      json.dumps({"base": base, "users": stats, "rollups": rollups}).encode())
+        return base
+
+    def _install(self, suffix):
+        """Move files written by _write_files into place"""
+        os.replace(self.path + suffix, self.path)
+        os.replace(self.stats_path + suffix, self.stats_path)
+
+    def _write_snapshot(self, users_data, path):
+        """Write user data to a snapshot file and return its fingerprint"""
+        raw = json.dumps(users_data, indent=4, default=_to_json).encode()
+        _atomic_write(path, raw)
+        return _fingerprint(raw)
+
+    def _read_snapshot(self):
+        """Return the parsed snapshot and its fingerprint"""
+        return self._read_json(self.path)
+
+    def _read_json(self, path):
+        """Return the histories in a bmi_data.json file and its fingerprint"""
+        if not os.path.exists(path):
+            return {}, _fingerprint(b"")
+        with open(path, 'rb') as f:
+            raw = f.read()
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return {}, _fingerprint(raw)
+        if not isinstance(data, dict):
+            return {}, _fingerprint(raw)
+        # Files written before entries had ids get them here and keep them on the next write
+        self.migrated = sum(assign_missing_ids(username, history)
+                            for username, history in data.items() if isinstance(history, list))
+        data = {username: UserHistory.from_entries(history) if isinstance(history, list) else history
+                for username, history in data.items()}
+        return data, _fingerprint(raw)
+
+    def _apply(self, record):
+        """Apply one insert/delete/clear record to the in-memory data"""
+        op = record.get('op')
+        username = record.get('user')
+        self.versions[username] = self.versions.get(username, 0) + 1
+        if op == 'append':
+            history = self.users_data.setdefault(username, UserHistory())
+            latest = None
+            if isinstance(history, UserHistory):
+                try:
+                    latest = history.append(record['entry'])
+                except ValueError:
+                    # Entries with unusual fields keep the user on a plain list
+                    history = self.users_data[username] = list(history)
+            if latest is None:
+                latest = insert_by_date(history, record['entry'])
+            if not latest:
+                # An older entry moves the first and last weights; rebuilt when next asked for
+                self.user_stats.pop(username, None)
+                self.user_rollups.pop(username, None)
+            if username in self.user_stats:
+                self.user_stats[username].add(record['entry'])
+            if username in self.user_rollups:
+                self.user_rollups[username].add(record['entry'])
+        elif op == 'delete':
+            history = self.users_data.get(username)
+            if isinstance(history, UserHistory):
+                history.remove_id(record['id'])
+            elif history is not None:
+                self.users_data[username] = [e for e in history if e.get('id') != record['id']]
+            # Rebuilt from the history the next time they are asked for
+            self.user_stats.pop(username, None)
+            self.user_rollups.pop(username, None)
+        elif op == 'clear':
+            self.users_data.pop(username, None)
+            self.user_stats.pop(username, None)
+            self.user_rollups.pop(username, None)
+
+    def _record(self, record):
+        """Hook for backends that persist individual records"""
+
+    def _check_writable(self):
+        if self.readonly:
+            raise OSError(f"{self.path} was loaded read-only")
+
+    def users(self):
+        """Return the names of all users with history"""
+        return list(self.users_data.keys())
+
+    def history(self, username):
+        """Return a user's entries, oldest first"""
+        return self.users_data.get(username, [])
+
+    def version(self, username):
+        """Return a number that changes whenever the user's history changes"""
+        return self.versions.get(username, 0)
+
+    def history_page(self, username, start, limit):
+        """Return up to `limit` entries, newest first, skipping the `start` newest"""
+        history = self.history(username)
+        end = len(history) - start
+        return history[max(end - limit, 0):max(end, 0)][::-1]
+
+    def stats(self, username):
+        """Return the RunningStats for a user, rebuilding them if a delete invalidated them"""
+        if username not in self.user_stats:
+            self.user_stats[username] = RunningStats.from_history(self.history(username))
+        return self.user_stats[username]
+
+    def rollups(self, username, granularity, start=None, end=None):
+        """Return (key, Bucket) pairs, oldest first, for a user's buckets overlapping [start, end]
+
+        `granularity` is "daily", "weekly" or "monthly"; dates are 'YYYY-MM-DD'.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        if username not in self.user_rollups:
+            self.user_rollups[username] = Rollups.from_history(self.history(username))
+        return self.user_rollups[username].query(granularity, start, end)
+
+    def append(self, username, entry):
+        """Add a measurement to a user's history, giving it a new id if it has none; returns the id"""
+        self._check_writable()
+        entry.setdefault('id', new_entry_id())
+        record = {"op": "append", "user": username, "entry": entry}
+        self._apply(record)
+        self._record(record)
+        return entry['id']
+
+    def delete(self, username, entry_id):
+        """Remove the entry with the given id from a user's history"""
+        self._check_writable()
+        record = {"op": "delete", "user": username, "id": entry_id}
+        self._apply(record)
+        self._record(record)
+
+    def purge(self, username):
+        """Drop the tombstones deletes left in a user's history once there are enough of them"""
+        self.begin_purge(username)()()
+
+    def begin_purge(self, username):
+        """Start a purge whose compaction runs while other threads use the store
+
+        Called like begin_commit: build(), returned with the store locked, compacts
+        a copy without the lock and returns finish(), which swaps the copy in with
+        the lock held unless the history changed meanwhile.
+        """
+        history = self.users_data.get(username)
+        if not isinstance(history, UserHistory) or not history.needs_purge():
+            return lambda: lambda: None
+        compacted = history.copy()
+        version = self.version(username)
+
+        def build():
+            compacted.compact()
+            compacted.index_ids()
+
+            def finish():
+                if self.users_data.get(username) is history and self.version(username) == version:
+                    self.users_data[username] = compacted
+            return finish
+        return build
+
+    def clear(self, username):
+        """Remove a user and their whole history"""
+        self._check_writable()
+        record = {"op": "clear", "user": username}
+        self._apply(record)
+        self._record(record)
+
+    @timed("store.commit")
+    def commit(self):
+        """Persist pending changes"""
+        self._check_writable()
+        self._save_snapshot()
+
+    def begin_commit(self):
+        """Start a commit whose slow part can run while other threads use the store
+
+        Call with the store locked. Returns write(), to call without the lock,
+        which writes the files and returns finish(), to call with the lock held
+        again. LockedStore.commit drives this.
+        """
+        captured = self._capture(copy=True)
+
+        def write():
+            self._write_files(captured, ".next")
+            return lambda: self._install(".next")
+        return write
+
+    def flush(self):
+        """Nothing to do; this backend only writes on commit, which rewrites the whole file"""
+
+    def close(self):
+        """Release any resources held by the store"""
+
+
+class JournalStore(JSONStore):
+    """Appends one record per change to a journal and folds it into the snapshot periodically
+
+    The snapshot keeps the bmi_data.json layout. The journal starts with a header
+    naming the snapshot it applies to, so a crash between writing the new snapshot
+    and resetting the journal never replays records twice.
+    """
+
+    def __init__(self, path, compact_every=1000):
+        super().__init__(path)
+        self.journal_path = os.path.splitext(path)[0] + ".journal"
+        self.compact_every = compact_every
+        self.pending = 0
+        self._journal = None
+        # Records made while begin_commit's snapshot is written; they go into the new journal
+        self._buffered = None
+
+    @timed("store.load")
+    def load(self, readonly=False):
+        """Load the snapshot and replay the journal on top of it
+
+        An unterminated last line, left by a crash mid-append, is cut off. Other
+        unreadable lines are skipped and reported on stderr, and the journal is
+        kept as <journal>.corrupt before it is compacted. Replayed records are
+        compacted into a new snapshot unless `readonly`, which leaves every file
+        as it is; see JSONStore.load.
+        """
+        self._close_journal()
+        self.readonly = readonly
+        self.users_data, base = self._read_snapshot()
+        self._load_stats(base)
+        self.pending = 0
+        journal_path = self.journal_path
+        if not readonly:
+            self._recover_journal(base)
+        elif self._journal_matches(base, journal_path + ".next"):
+            # The swap a crash interrupted is finished by the next writable load
+            journal_path += ".next"
+
+        if os.path.exists(journal_path):
+            with open(journal_path, 'rb') as f:
+                data = f.read()
+            end = data.find(b"\n") + 1
+            try:
+                header = json.loads(data[:end])
+            except ValueError:
+                header = {}
+            if end and header.get('base') == base:
+                skipped = 0
+                while end < len(data):
+                    line_end = data.find(b"\n", end)
+                    if line_end < 0:
+                        break
+                    try:
+                        record = json.loads(data[end:line_end])
+                    except ValueError:
+                        record = None
+                    if isinstance(record, dict):
+                        self._apply(record)
+                        self.pending += 1
+                    else:
+                        # A complete line was written, so the records after it are still good
+                        line_no = data.count(b"\n", 0, end) + 1
+                        print(f"{journal_path}:{line_no}: Skipped unreadable journal record",
+                              file=sys.stderr)
+                        skipped += 1
+                    end = line_end + 1
+                if skipped and not readonly:
+                    # Compacting below drops the journal; keep the lines that were skipped
+                    shutil.copyfile(self.journal_path, self.journal_path + ".corrupt")
+                if end < len(data) and not readonly:
+                    # A torn final line from a crash mid-append; cut it off so the
+                    # next record does not get glued onto it and lost on replay
+                    with open(self.journal_path, 'rb+') as f:
+                        f.truncate(end)
+
+        if not readonly:
+            if self.pending or self.migrated:
+                self.compact()
+            elif not self._journal_matches(base):
+                self._reset_journal(base)
+        return self.users_data
+
+    def _journal_matches(self, base, path=None):
+        """Check whether the journal on disk belongs to the snapshot with this fingerprint"""
+        try:
+            with open(path or self.journal_path, 'rb') as f:
+                return json.loads(f.readline()).get('base') == base
+        except (OSError, ValueError):
+            return False
+
+    def _recover_journal(self, base):
+        """Finish or discard a journal swap a crash interrupted in begin_commit"""
+        next_path = self.journal_path + ".next"
+        if not os.path.exists(next_path):
+            return
+        if self._journal_matches(base, next_path):
+            # The new snapshot was installed but its journal was not
+            os.replace(next_path, self.journal_path)
+        else:
+            os.remove(next_path)
+
+    def _reset_journal(self, base):
+        """Start an empty journal for the snapshot with this fingerprint"""
+        header = json.dumps({"base": base}).encode() + b"\n"
+        _atomic_write(self.journal_path, header)
+
+    def _open_journal(self):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'ab')
+        return self._journal
+
+    def _record(self, record):
+        line = json.dumps(record).encode() + b"\n"
+        self._open_journal().write(line)
+        self.pending += 1
+        if self._buffered is not None:
+            self._buffered.append(line)
+
+    @timed("store.commit")
+    def commit(self):
+        """Flush journal records to disk, compacting once enough have built up"""
+        self._check_writable()
+        self.flush()
+        if self.pending >= self.compact_every:
+            self.compact()
+
+    def flush(self):
+        """Make journal records durable without compacting, for bulk writers that commit once at the end"""
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def begin_commit(self):
+        """Start a commit that fsyncs, and compacts when due, without holding the store lock
+
+        See JSONStore.begin_commit. A compaction writes the new snapshot from a
+        copy. Records made meanwhile stay in the old journal and are copied into
+        the new one when it is swapped in, so a failed write loses nothing.
+        """
+        fd = None
+        if self._journal is not None:
+            self._journal.flush()
+            fd = self._journal.fileno()
+        if self.pending < self.compact_every:
+            def write():
+                if fd is not None:
+                    os.fsync(fd)
+                return lambda: None
+            return write
+
+        captured = self._capture(copy=True)
+        self._buffered = []
+
+        def write():
+            if fd is not None:
+                os.fsync(fd)
+            base = self._write_files(captured, ".next")
+
+            def finish():
+                records, self._buffered = self._buffered, None
+                self._close_journal()
+                # The new journal is ready before the snapshot it belongs to is
+                # installed; load() finishes the swap if a crash interrupts it
+                next_path = self.journal_path + ".next"
+                _atomic_write(next_path, json.dumps({"base": base}).encode() + b"\n" + b"".join(records))
+                self._install(".next")
+                os.replace(next_path, self.journal_path)
+                self.pending = len(records)
+            return finish
+        return write
+
+    @timed("store.compact")
+    def compact(self):
+        """Write the current data as a new snapshot and start an empty journal"""
+        self._close_journal()
+        self._reset_journal(self._save_snapshot())
+        self.pending = 0
+        self._buffered = None
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def close(self):
+        self._close_journal()
+
+
+class BinaryStore(JournalStore):
+    """Journal store whose snapshot is the mmap-backed binary format in bmi_core.binfmt
+
+    Users are listed from the snapshot index at startup and their history is
+    only read the first time it is needed.
+    """
+
+    def __init__(self, path, compact_every=1000):
+        super().__init__(path, compact_every)
+        self.json_path = path
+        self.path = os.path.splitext(path)[0] + ".bmi"
+        self.journal_path = self.path + ".journal"
+        self.stats_path = self.path + ".stats.json"
+        self.snapshot = None
+
+    def _read_snapshot(self):
+        """Open the snapshot; histories stay unloaded (None) until first use
+
+        On first use an existing bmi_data.json is converted.
+        """
+        from .binfmt import BinarySnapshot, json_to_binary
+
+        self._close_snapshot()
+        if not os.path.exists(self.path):
+            if not os.path.exists(self.json_path):
+                return {}, ""
+            if self.readonly:
+                # Read the file the snapshot would be converted from, without converting it
+                users_data, _ = self._read_json(self.json_path)
+                return users_data, ""
+            json_to_binary(self.json_path, self.path)
+        self.snapshot = BinarySnapshot(self.path)
+        return dict.fromkeys(self.snapshot.users()), self.snapshot.generation
+
+    def _materialize(self, username):
+        if username in self.users_data and self.users_data[username] is None:
+            self.users_data[username] = self.snapshot.read_user(username)
+
+    def _write_snapshot(self, users_data, path):
+        """Stream every user into a new snapshot, reading unloaded ones straight from the old file"""
+        from .binfmt import write_snapshot
+
+        def users():
+            for username, history in users_data.items():
+                if history is None:
+                    history = self.snapshot.read_user(username)
+                elif not isinstance(history, UserHistory):
+                    # Stored as JSON inside the snapshot if it still does not fit the columns
+                    history = UserHistory.from_entries(history)
+                yield username, history
+
+        return write_snapshot(path, users())
+
+    def _install(self, suffix):
+        from .binfmt import BinarySnapshot
+
+        # Windows cannot replace a file that is still mapped
+        self._close_snapshot()
+        try:
+            super()._install(suffix)
+        finally:
+            self.snapshot = BinarySnapshot(self.path)
+
+    def _apply(self, record):
+        self._materialize(record.get('user'))
+        super()._apply(record)
+
+    def history(self, username):
+        """Return a user's entries, oldest first"""
+        self._materialize(username)
+        return super().history(username)
+
+    def _close_snapshot(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+    def close(self):
+        super().close()
+        self._close_snapshot()
+
+
+class SharedStore(JournalStore):
+    """Journal store that several processes, possibly on different machines, can share
+
+    Changes are held in memory until commit. A commit takes an advisory lock on
+    `<base>.lock`, reads whatever other instances appended to the journal since
+    this one last looked, folds those records in, and then appends its own. The
+    journal offset is the version this instance has seen. Appends, deletes and
+    clears are replayed rather than written back as a whole, so concurrent
+    changes merge and none are lost. The lock is only held for that read and
+    append, except when a commit also compacts the journal.
+
+    Users whose history other instances changed are collected in `merged` and
+    handed out by sync(), so a GUI can redraw what it shows for them.
+    """
+
+    # Merging other instances' records changes the data, so commits run under the store lock
+    begin_commit = None
+
+    def __init__(self, path, compact_every=1000):
+        super().__init__(path, compact_every)
+        self.lock_path = os.path.splitext(path)[0] + ".lock"
+        self.base = None
+        self.offset = 0
+        self.unsynced = []
+        self.merged = set()
+
+    def _locked(self):
+        from .filelock import FileLock
+        return FileLock(self.lock_path)
+
+    @timed("store.load")
+    def load(self, readonly=False):
+        """Load the snapshot and the shared journal; see JournalStore.load for `readonly`"""
+        if readonly:
+            with self._locked():
+                return super().load(readonly=True)
+        self.readonly = False
+        with self._locked():
+            self._reload()
+            if not self.offset:
+                self._reset_journal(self.base)
+                self.offset = os.path.getsize(self.journal_path)
+        self.merged = set()
+        return self.users_data
+
+    def _reload(self):
+        """Read the snapshot and every journal record, then reapply changes not yet committed"""
+        # Anyone may have changed, so report every user before and after
+        self.merged.update(self.users_data)
+        self.users_data, self.base = self._read_snapshot()
+        self._load_stats(self.base)
+        self.pending = 0
+        self.offset = 0
+        if self._journal_matches(self.base):
+            with open(self.journal_path, 'rb') as f:
+                self.offset = len(f.readline())
+            self._pull()
+        for record in self.unsynced:
+            self._apply(record)
+        self.merged.update(self.users_data)
+        # Replaying only bumps users with journal records; the snapshot may have changed the rest
+        for username in self.merged:
+            self.versions[username] = self.versions.get(username, 0) + 1
+
+    def _pull(self):
+        """Apply records other instances appended after our offset; call with the lock held"""
+        with open(self.journal_path, 'rb+') as f:
+            f.seek(self.offset)
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                # Left by a writer that crashed mid-append; nobody else can be writing now
+                f.truncate(self.offset + end)
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            self._apply(record)
+            self.merged.add(record.get('user'))
+            self.pending += 1
+        self.offset += end
+
+    def sync(self):
+        """Fold in changes committed by other instances; returns the users whose history they changed
+
+        That includes changes folded in by commits since the last sync.
+        """
+        with self._locked(), timed("store.lock_held"):
+            self._sync()
+        merged, self.merged = self.merged, set()
+        return merged
+
+    def _sync(self):
+        if self._journal_matches(self.base):
+            self._pull()
+        else:
+            # Another instance compacted the journal into a new snapshot
+            self._reload()
+
+    def _record(self, record):
+        self.unsynced.append(record)
+
+    @timed("store.commit")
+    def commit(self):
+        """Merge in other instances' changes and append ours to the shared journal"""
+        self._check_writable()
+        with self._locked(), timed("store.lock_held"):
+            self._flush()
+            if self.pending >= self.compact_every:
+                self._compact()
+
+    def flush(self):
+        """Like commit, but never compacts the journal"""
+        with self._locked(), timed("store.lock_held"):
+            self._flush()
+
+    def _flush(self):
+        self._sync()
+        if self.unsynced:
+            data = b"".join(json.dumps(record).encode() + b"\n" for record in self.unsynced)
+            with open(self.journal_path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.offset += len(data)
+            self.pending += len(self.unsynced)
+            self.unsynced = []
+
+    @timed("store.compact")
+    def compact(self):
+        """Merge in other instances' changes, add ours, and write it all as a new snapshot"""
+        self._check_writable()
+        with self._locked(), timed("store.lock_held"):
+            self._flush()
+            self._compact()
+
+    def _compact(self):
+        """Write the current data as a new snapshot and start an empty journal; call with the lock held"""
+        self.base = self._save_snapshot()
+        self._reset_journal(self.base)
+        self.offset = os.path.getsize(self.journal_path)
+        self.pending = 0
+
+
+class SQLiteStore:
+    """Keeps entries in an indexed SQLite table so nothing is loaded up front
+
+    On first open an existing bmi_data.json is migrated in the same transaction
+    that creates the tables, and PRAGMA user_version records that it finished.
+    Entry ids live in the entry_id column. Rows are ordered by date, and the
+    integer id column orders rows with the same date.
+    """
+
+    COLUMNS = ("id", "date", "weight", "height", "bmi", "category")
+    SELECT = "SELECT entry_id, date, weight, height, bmi, category FROM entries"
+    # Leads with the row id, which with the date is where the next page starts
+    PAGE_SELECT = "SELECT id, entry_id, date, weight, height, bmi, category FROM entries"
+    MIGRATED = 1
+
+    def __init__(self, path):
+        self.json_path = path
+        self.path = os.path.splitext(path)[0] + ".db"
+        self.conn = None
+        self.versions = {}
+        self.readonly = False
+        self._users = None
+        # ((username, start, version) of the page that would follow, (date, id) of the last row returned)
+        self._next_page = None
+
+    @timed("store.load")
+    def load(self, readonly=False):
+        """Open the database, creating and migrating it if needed
+
+        With `readonly`, an existing database is opened for queries only, which
+        is safe from another process while this one keeps writing. If there is
+        no database yet, bmi_data.json is read into one in memory instead.
+        """
+        self.close()
+        self.readonly = readonly
+        if readonly:
+            self._open_readonly()
+            return
+        # Calls may come from worker threads; callers serialize them (see LockedStore)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # DDL would otherwise autocommit, leaving an empty database if the migration failed
+        self.conn.execute("BEGIN")
+        try:
+            self._create_tables()
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.MIGRATED:
+                self.migrate_json(self.json_path)
+                self.conn.execute(f"PRAGMA user_version = {self.MIGRATED}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.close()
+            raise
+
+    def _open_readonly(self):
+        """Open the database without creating or changing any file"""
+        if os.path.exists(self.path):
+            uri = pathlib.Path(os.path.abspath(self.path)).as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._create_tables()
+            self.migrate_json(self.json_path)
+            self.conn.commit()
+        self.conn.execute("PRAGMA query_only = ON")
+
+    def _create_tables(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " id INTEGER PRIMARY KEY,"
+            " username TEXT NOT NULL,"
+            " date TEXT NOT NULL,"
+            " weight REAL, height REAL, bmi REAL, category TEXT, entry_id TEXT)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_user_date ON entries (username, date)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_user_id ON entries (username, id)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_user_entry_id ON entries (username, entry_id)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_stats (username TEXT PRIMARY KEY, stats TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            " username TEXT NOT NULL, granularity TEXT NOT NULL, bucket TEXT NOT NULL,"
+            " count INTEGER, bmi_sum REAL, bmi_min REAL, bmi_max REAL,"
+            " weight_sum REAL, weight_min REAL, weight_max REAL,"
+            " first_weight REAL, last_weight REAL,"
+            " PRIMARY KEY (username, granularity, bucket)) WITHOUT ROWID"
+        )
+
+    def migrate_json(self, json_path):
+        """Copy every entry from a bmi_data.json file into the database"""
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r') as f:
+                users_data = json.load(f)
+        except ValueError:
+            return
+        for username, history in users_data.items():
+            if isinstance(history, list):
+                assign_missing_ids(username, history)
+        rows = (
+            (username, entry.get('date', ''), entry.get('weight'), entry.get('height'),
+             entry.get('bmi'), entry.get('category'), entry['id'])
+            for username, history in users_data.items() if isinstance(history, list)
+            for entry in history if isinstance(entry, dict)
+        )
+        self.conn.executemany(
+            "INSERT INTO entries (username, date, weight, height, bmi, category, entry_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+    def _check_writable(self):
+        if self.readonly:
+            raise OSError(f"{self.path} was loaded read-only")
+
+    def readonly_copy(self):
+        """Return an unopened store on the same database, for load(readonly=True) in another process
+
+        Returns None while there is no database file, since every copy would
+        have to read bmi_data.json into memory again.
+        """
+        if not os.path.exists(self.path):
+            return None
+        return SQLiteStore(self.json_path)
+
+    def users(self):
+        """Return the names of all users with history"""
+        if self._users is None:
+            # Scanned once; append, delete and clear keep it up to date from then on
+            self._users = dict.fromkeys(row[0] for row in self.conn.execute(
+                "SELECT username FROM entries GROUP BY username ORDER BY MIN(id)"))
+        return list(self._users)
+
+    def history(self, username):
+        """Return a user's entries, oldest first"""
+        cursor = self.conn.execute(
+            self.SELECT + " WHERE username = ? ORDER BY date, id", (username,))
+        return [dict(zip(self.COLUMNS, row)) for row in cursor]
+
+    def version(self, username):
+        """Return a number that changes whenever the user's history changes"""
+        return self.versions.get(username, 0)
+
+    def _changed(self, username):
+        self.versions[username] = self.versions.get(username, 0) + 1
+
+    def history_page(self, username, start, limit):
+        """Return up to `limit` entries, newest first, skipping the `start` newest
+
+        A page that starts where the previous one ended continues below that
+        page's last row instead of counting past `start` rows again.
+        """
+        key = (username, start, self.version(username))
+        if start and self._next_page is not None and self._next_page[0] == key:
+            cursor = self.conn.execute(
+                self.PAGE_SELECT + " WHERE username = ? AND (date, id) < (?, ?)"
+                " ORDER BY date DESC, id DESC LIMIT ?",
+                (username, *self._next_page[1], limit))
+        else:
+            cursor = self.conn.execute(
+                self.PAGE_SELECT + " WHERE username = ? ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+                (username, limit, start))
+        rows = cursor.fetchall()
+        if rows:
+            self._next_page = ((username, start + len(rows), key[2]), (rows[-1][2], rows[-1][0]))
+        return [dict(zip(self.COLUMNS, row[1:])) for row in rows]
+
+    def _cached_stats(self, username):
+        row = self.conn.execute("SELECT stats FROM user_stats WHERE username = ?",
+                                (username,)).fetchone()
+        return RunningStats.from_dict(json.loads(row[0])) if row else None
+
+    def _cache_stats(self, username, stats):
+        self.conn.execute("INSERT OR REPLACE INTO user_stats (username, stats) VALUES (?, ?)",
+                          (username, json.dumps(stats.to_dict())))
+
+    def stats(self, username):
+        """Return the RunningStats for a user, rebuilding them if a delete invalidated them
+
+        A read-only store rebuilds them without caching them.
+        """
+        stats = self._cached_stats(username)
+        if stats is None:
+            stats = RunningStats.from_history(self.history(username))
+            if not self.readonly:
+                self._cache_stats(username, stats)
+        return stats
+
+    def _has_rollups(self, username):
+        return self.conn.execute("SELECT 1 FROM rollups WHERE username = ? LIMIT 1",
+                                 (username,)).fetchone() is not None
+
+    def _rollup_entry(self, username, entry):
+        """Fold one entry into the user's daily, weekly and monthly rollup rows"""
+        try:
+            date, bmi, weight = entry['date'], entry['bmi'], entry['weight']
+            keys = [(granularity, bucket_key(date, granularity)) for granularity in GRANULARITIES]
+        except (KeyError, TypeError, ValueError):
+            return
+        self.conn.executemany(
+            "INSERT INTO rollups VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (username, granularity, bucket) DO UPDATE SET"
+            " count = count + 1, bmi_sum = bmi_sum + excluded.bmi_sum,"
+            " bmi_min = MIN(bmi_min, excluded.bmi_min), bmi_max = MAX(bmi_max, excluded.bmi_max),"
+            " weight_sum = weight_sum + excluded.weight_sum,"
+            " weight_min = MIN(weight_min, excluded.weight_min),"
+            " weight_max = MAX(weight_max, excluded.weight_max),"
+            " last_weight = excluded.last_weight",
+            [(username, granularity, key, bmi, bmi, bmi, weight, weight, weight, weight, weight)
+             for granularity, key in keys])
+
+    def rollups(self, username, granularity, start=None, end=None):
+        """Return (key, Bucket) pairs, oldest first, for a user's buckets overlapping [start, end]
+
+        `granularity` is "daily", "weekly" or "monthly"; dates are 'YYYY-MM-DD'.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        if not self._has_rollups(username):
+            if self.readonly:
+                return Rollups.from_history(self.history(username)).query(granularity, start, end)
+            for entry in self.history(username):
+                self._rollup_entry(username, entry)
+        cursor = self.conn.execute(
+            "SELECT bucket, " + ", ".join(Bucket.__slots__) + " FROM rollups"
+            " WHERE username = ? AND granularity = ? AND bucket BETWEEN ? AND ?"
+            " ORDER BY bucket",
+            (username, granularity,
+             bucket_key(start, granularity) if start else "",
+             bucket_key(end, granularity) if end else "\uffff"))
+        return [(row[0], Bucket.from_list(row[1:])) for row in cursor]
+
+    def append(self, username, entry):
+        """Add a measurement to a user's history, giving it a new id if it has none; returns the id"""
+        self._check_writable()
+        entry.setdefault('id', new_entry_id())
+        newest = self.conn.execute("SELECT MAX(date) FROM entries WHERE username = ?",
+                                   (username,)).fetchone()[0]
+        self.conn.execute(
+            "INSERT INTO entries (username, date, weight, height, bmi, category, entry_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (username, entry['date'], entry['weight'], entry['height'],
+             entry['bmi'], entry['category'], entry['id']))
+        if self._users is not None:
+            self._users.setdefault(username)
+        self._changed(username)
+        if newest is not None and entry['date'] < newest:
+            # An older entry moves the first and last weights
+            self._invalidate(username)
+            return entry['id']
+        stats = self._cached_stats(username)
+        if stats is not None:
+            stats.add(entry)
+            self._cache_stats(username, stats)
+        # Users without rollup rows are rebuilt in full on their next query
+        if self._has_rollups(username):
+            self._rollup_entry(username, entry)
+        return entry['id']
+
+    def _invalidate(self, username):
+        """Drop cached statistics and rollups; they are rebuilt the next time they are asked for"""
+        self.conn.execute("DELETE FROM user_stats WHERE username = ?", (username,))
+        self.conn.execute("DELETE FROM rollups WHERE username = ?", (username,))
+
+    def delete(self, username, entry_id):
+        """Remove the entry with the given id from a user's history"""
+        self._check_writable()
+        self.conn.execute("DELETE FROM entries WHERE username = ? AND entry_id = ?",
+                          (username, entry_id))
+        if self._users is not None and self.conn.execute(
+                "SELECT 1 FROM entries WHERE username = ? LIMIT 1", (username,)).fetchone() is None:
+            self._users.pop(username, None)
+        self._changed(username)
+        self._invalidate(username)
+
+    def purge(self, username):
+        """Nothing to do; rows are deleted in place"""
+
+    def clear(self, username):
+        """Remove a user and their whole history"""
+        self._check_writable()
+        self.conn.execute("DELETE FROM entries WHERE username = ?", (username,))
+        if self._users is not None:
+            self._users.pop(username, None)
+        self._changed(username)
+        self._invalidate(username)
+
+    @timed("store.commit")
+    def commit(self):
+        """Persist pending changes"""
+        self.conn.commit()
+
+    def flush(self):
+        """Same as commit; a transaction commit costs the same however big the table is"""
+        self.conn.commit()
+
+    def close(self):
+        """Close the database connection"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        self._users = None
+        self._next_page = None
+
+
+BACKENDS = {
+    "json": JSONStore,
+    "journal": JournalStore,
+    "binary": BinaryStore,
+    "shared": SharedStore,
+    "sqlite": SQLiteStore,
+}
+
+
+def open_store(path, backend=None):
+    """Create the storage backend named by `backend` or the BMI_STORE environment variable"""
+    backend = backend or os.environ.get("BMI_STORE", "journal")
+    try:
+        store_class = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return store_class(path)
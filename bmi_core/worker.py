@@ -0,0 +1,149 @@
+"""Background threads for saving and for read-only work such as statistics
+
+Nothing here touches Tk. Finished work is queued and the GUI runs the
+callbacks on its own thread by calling BackgroundWorker.run_callbacks from
+root.after.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrument import timed
+
+
+class LockedStore:
+    """Wraps a store so calls from the GUI thread and worker threads never interleave
+
+    Commits only hold the lock while changes are captured and while the new
+    files are swapped in, so other threads are not held up by the write itself.
+    Purges likewise compact a copy of the history without the lock.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self.lock = threading.RLock()
+        # Commits are serialized separately, since most of one runs without `lock`
+        self._commit_lock = threading.Lock()
+
+    def commit(self):
+        begin = getattr(self._store, 'begin_commit', None)
+        with self._commit_lock:
+            if begin is None:
+                with self.lock:
+                    return self._store.commit()
+            with timed("store.commit"):
+                with self.lock:
+                    write = begin()
+                finish = write()
+                with self.lock:
+                    finish()
+
+    def purge(self, username):
+        begin = getattr(self._store, 'begin_purge', None)
+        if begin is None:
+            with self.lock:
+                return self._store.purge(username)
+        with self.lock:
+            build = begin(username)
+        finish = build()
+        with self.lock:
+            finish()
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+class CoalescingWriter:
+    """Single thread that commits the store whenever a save has been requested
+
+    Save requests that arrive while a commit is running are merged into one
+    follow-up commit, so a burst of changes costs at most two writes. Every
+    change applied before a request is covered by the commit that answers it.
+    """
+
+    def __init__(self, commit):
+        self._commit = commit
+        self._cond = threading.Condition()
+        self._requested = False
+        self._stopping = False
+        self._callbacks = []
+        self.commits = 0
+        self._thread = threading.Thread(target=self._run, name="bmi-writer", daemon=True)
+        self._thread.start()
+
+    def request(self, callback=None):
+        """Ask for a commit; `callback(error)` runs on the writer thread once it is done"""
+        with self._cond:
+            self._requested = True
+            if callback is not None:
+                self._callbacks.append(callback)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._requested and not self._stopping:
+                    self._cond.wait()
+                if not self._requested:
+                    return
+                self._requested = False
+                callbacks, self._callbacks = self._callbacks, []
+
+            try:
+                self._commit()
+                error = None
+            except Exception as e:
+                error = e
+            self.commits += 1
+            for callback in callbacks:
+                callback(error)
+
+    def stop(self):
+        """Finish any requested commit and end the thread"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+
+
+class BackgroundWorker:
+    """Coalesced saves on one writer thread plus a pool for read-only jobs"""
+
+    def __init__(self, store, max_workers=2):
+        self.writer = CoalescingWriter(store.commit)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bmi-worker")
+        self.finished = queue.Queue()
+
+    def save(self, callback=None):
+        """Request a commit; `callback(None, error)` is queued for the GUI thread"""
+        self.writer.request(lambda error: self.finished.put((callback, None, error)))
+
+    def submit(self, fn, callback, *args):
+        """Run fn(*args) on the pool; `callback(result, error)` is queued for the GUI thread"""
+        def done(future):
+            error = future.exception()
+            result = None if error else future.result()
+            self.finished.put((callback, result, error))
+        self.pool.submit(fn, *args).add_done_callback(done)
+
+    def run_callbacks(self):
+        """Run every queued callback; call this from the GUI thread"""
+        while True:
+            try:
+                callback, result, error = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            if callback is not None:
+                callback(result, error)
+
+    def close(self):
+        """Wait for pending saves and jobs to finish"""
+        self.pool.shutdown(wait=True)
+        self.writer.stop()
@@ -0,0 +1,40 @@
+"""Helpers shared by the tests
+
+Importing this module puts the repository root on sys.path, so bmi_core can
+be imported however the tests are run.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bmi_core import calculate_bmi, categorize_bmi
+from bmi_core.columnar import seconds_to_date
+
+
+def make_entry(i):
+    """Return the i-th of a series of entries, one second apart"""
+    weight = 50 + i % 80
+    bmi = calculate_bmi(weight, 175)
+    return {
+        "date": seconds_to_date(1_500_000_000 + i),
+        "weight": float(weight),
+        "height": 175.0,
+        "bmi": round(bmi, 2),
+        "category": categorize_bmi(bmi)[0],
+    }
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Gives each test an empty directory; self.path is bmi_data.json inside it"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="bmi-test-")
+        self.path = os.path.join(self.workdir, "bmi_data.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
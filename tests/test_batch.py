@@ -0,0 +1,65 @@
+"""NumPy and pure-Python batch scoring give the same BMIs and categories
+
+Run with: python -m unittest discover tests
+"""
+import unittest
+
+from support import make_entry
+
+from bmi_core.batch import calculate_bmi_batch, categorize_bmi_batch, load_numpy, score_batch
+from bmi_core.bmi import CATEGORIES, SCHEME, THRESHOLDS, calculate_bmi
+
+WEIGHTS = [45.0, 56.7, 70.0, 76.5, 91.9, 150.0, 0.5, 500.0]
+HEIGHTS = [175.0, 175.0, 175.0, 175.0, 175.0, 160.0, 50.0, 300.0]
+# Every cutoff, and values just either side of it
+BOUNDARY_BMIS = [t + d for t in THRESHOLDS for d in (-0.01, 0.0, 0.01)] + [0.0, 12.0, 80.0]
+
+
+class PurePythonBatchTest(unittest.TestCase):
+
+    def test_matches_the_scalar_functions(self):
+        bmis, codes = score_batch(WEIGHTS, HEIGHTS, use_numpy=False)
+        self.assertEqual(bmis, [calculate_bmi(w, h) for w, h in zip(WEIGHTS, HEIGHTS)])
+        self.assertEqual(codes, [SCHEME.code(bmi) for bmi in bmis])
+
+    def test_cutoffs_belong_to_the_category_above(self):
+        codes = categorize_bmi_batch(BOUNDARY_BMIS, use_numpy=False)
+        self.assertEqual(codes, [SCHEME.code(bmi) for bmi in BOUNDARY_BMIS])
+        self.assertEqual(categorize_bmi_batch(THRESHOLDS, use_numpy=False), [1, 2, 3])
+
+    def test_matches_saved_entries(self):
+        entries = [make_entry(i) for i in range(80)]
+        bmis, codes = score_batch([e['weight'] for e in entries], [e['height'] for e in entries],
+                                  use_numpy=False)
+        self.assertEqual([round(bmi, 2) for bmi in bmis], [e['bmi'] for e in entries])
+        self.assertEqual([CATEGORIES[code][0] for code in codes], [e['category'] for e in entries])
+
+
+@unittest.skipIf(load_numpy() is None, "NumPy is not installed")
+class NumPyBatchTest(unittest.TestCase):
+
+    def assertBMIsEqual(self, bmis, expected):
+        self.assertEqual(len(bmis), len(expected))
+        for bmi, other in zip(bmis, expected):
+            self.assertAlmostEqual(bmi, other, places=12)
+
+    def test_bmis_match_the_fallback(self):
+        self.assertBMIsEqual(calculate_bmi_batch(WEIGHTS, HEIGHTS, use_numpy=True).tolist(),
+                             calculate_bmi_batch(WEIGHTS, HEIGHTS, use_numpy=False))
+
+    def test_codes_match_the_fallback_at_the_cutoffs(self):
+        codes = categorize_bmi_batch(BOUNDARY_BMIS, use_numpy=True)
+        self.assertEqual(codes.tolist(), categorize_bmi_batch(BOUNDARY_BMIS, use_numpy=False))
+
+    def test_structured_array_input(self):
+        np = load_numpy()
+        rows = np.zeros(len(WEIGHTS), dtype=[('weight', 'f8'), ('height', 'f8')])
+        rows['weight'], rows['height'] = WEIGHTS, HEIGHTS
+        bmis, codes = score_batch(rows)
+        expected_bmis, expected_codes = score_batch(WEIGHTS, HEIGHTS, use_numpy=False)
+        self.assertBMIsEqual(bmis.tolist(), expected_bmis)
+        self.assertEqual(codes.tolist(), expected_codes)
+
+
+if __name__ == "__main__":
+    unittest.main()
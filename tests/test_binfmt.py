@@ -0,0 +1,112 @@
+"""Binary snapshot conversion and BinaryStore compaction
+
+Run with: python -m unittest discover tests
+"""
+import json
+import os
+import unittest
+
+from support import TempDirTestCase, make_entry
+
+from bmi_core.binfmt import BinarySnapshot, binary_to_json, json_to_binary
+from bmi_core.columnar import UserHistory, assign_missing_ids
+from bmi_core.storage import BinaryStore
+
+
+class BinarySnapshotTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.json_path = self.path
+        self.binary_path = os.path.join(self.workdir, "bmi_data.bmi")
+
+    def test_json_round_trip(self):
+        # alice has no ids yet, like a file from before entries had them; bob's
+        # extra field does not fit the columns, so his history is kept as JSON
+        users_data = {
+            "alice": [make_entry(i) for i in range(50)],
+            "bob": [dict(make_entry(i), note="after lunch") for i in range(3)],
+            "carol": [],
+        }
+        with open(self.json_path, 'w') as f:
+            json.dump(users_data, f)
+        for username, history in users_data.items():
+            assign_missing_ids(username, history)
+
+        json_to_binary(self.json_path, self.binary_path)
+        snapshot = BinarySnapshot(self.binary_path)
+        try:
+            self.assertEqual(snapshot.users(), ["alice", "bob", "carol"])
+            alice = snapshot.read_user("alice")
+            self.assertIsInstance(alice, UserHistory)
+            self.assertEqual(list(alice), users_data["alice"])
+            self.assertEqual(snapshot.read_user("bob"), users_data["bob"])
+            self.assertEqual(list(snapshot.read_user("carol")), [])
+        finally:
+            snapshot.close()
+
+        round_trip = os.path.join(self.workdir, "round_trip.json")
+        binary_to_json(self.binary_path, round_trip)
+        with open(round_trip, 'r') as f:
+            self.assertEqual(json.load(f), users_data)
+
+    def test_rejects_other_files(self):
+        with open(self.binary_path, 'wb') as f:
+            f.write(b"not a snapshot")
+        with self.assertRaises(ValueError):
+            BinarySnapshot(self.binary_path)
+
+
+class BinaryStoreCompactionTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        store = BinaryStore(self.path)
+        store.load()
+        for n, username in enumerate(("alice", "bob", "carol")):
+            for i in range(20):
+                store.append(username, make_entry(n * 100 + i))
+        store.compact()
+        store.close()
+
+    def expected(self, n, count=20):
+        return [make_entry(n * 100 + i)['date'] for i in range(count)]
+
+    def reload(self):
+        store = BinaryStore(self.path)
+        store.load()
+        dates = {username: [entry['date'] for entry in store.history(username)]
+                 for username in store.users()}
+        store.close()
+        return dates
+
+    def test_compaction_keeps_users_that_were_never_loaded(self):
+        store = BinaryStore(self.path)
+        store.load()
+        store.append("bob", make_entry(120))
+        # alice and carol are only in the old snapshot when it is rewritten
+        self.assertIsNone(store.users_data["alice"])
+        store.compact()
+        self.assertIsNone(store.users_data["carol"])
+        store.close()
+
+        dates = self.reload()
+        self.assertEqual(dates["alice"], self.expected(0))
+        self.assertEqual(dates["bob"], self.expected(1, 21))
+        self.assertEqual(dates["carol"], self.expected(2))
+
+    def test_background_compaction_keeps_users_that_were_never_loaded(self):
+        store = BinaryStore(self.path, compact_every=1)
+        store.load()
+        store.append("carol", make_entry(220))
+        store.begin_commit()()()
+        store.close()
+
+        dates = self.reload()
+        self.assertEqual(dates["alice"], self.expected(0))
+        self.assertEqual(dates["bob"], self.expected(1))
+        self.assertEqual(dates["carol"], self.expected(2, 21))
+
+
+if __name__ == "__main__":
+    unittest.main()
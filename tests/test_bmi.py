@@ -0,0 +1,54 @@
+"""Category schemes: cutoffs, reference text and result rendering
+
+Run with: python -m unittest discover tests
+"""
+import unittest
+
+from support import make_entry
+
+from bmi_core.bmi import CATEGORIES, CategoryScheme, format_result, get_scheme
+
+
+class CategorySchemeTest(unittest.TestCase):
+
+    def test_code_at_the_cutoffs(self):
+        who = get_scheme("who")
+        self.assertEqual([who.code(bmi) for bmi in (18.49, 18.5, 24.99, 25, 29.99, 30)],
+                         [0, 1, 1, 2, 2, 3])
+        asian = get_scheme("asian")
+        self.assertEqual([asian.code(bmi) for bmi in (22.99, 23, 27.49, 27.5)], [1, 2, 2, 3])
+        self.assertEqual(asian.categorize(23), CATEGORIES[2])
+
+    def test_reference_text(self):
+        self.assertEqual([text for _, text, _ in get_scheme("who").references()],
+                         ["< 18.5", "18.5 - 24.9", "25 - 29.9", "≥ 30"])
+        self.assertEqual([text for _, text, _ in get_scheme("asian").references()],
+                         ["< 18.5", "18.5 - 22.9", "23 - 27.4", "≥ 27.5"])
+
+    def test_threshold_lines_are_labelled_with_the_category_below(self):
+        self.assertEqual([(bmi, label) for bmi, _, label in get_scheme("who").threshold_lines()],
+                         [(18.5, "Underweight"), (25, "Normal"), (30, "Overweight")])
+
+    def test_bad_thresholds_are_rejected(self):
+        for thresholds in ((18.5, 25), (18.5, 25, 30, 35), (25, 18.5, 30), (18.5, 18.5, 30)):
+            with self.subTest(thresholds=thresholds):
+                with self.assertRaises(ValueError):
+                    CategoryScheme("bad", "Bad", thresholds)
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            get_scheme("nope")
+
+    def test_format_result(self):
+        self.assertEqual(format_result(22.857),
+                         "BMI: 22.86\n\nCategory: Normal weight\n\n"
+                         "Great! You're at a healthy weight. Keep it up!")
+
+    def test_format_result_names_the_saved_category(self):
+        for entry in map(make_entry, range(0, 80, 5)):
+            with self.subTest(bmi=entry['bmi']):
+                self.assertIn(f"Category: {entry['category']}\n", format_result(entry['bmi']))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Batch scoring of CSV and JSONL files with score_files
+
+Run with: python -m unittest discover tests
+"""
+import csv
+import io
+import json
+import os
+import unittest
+
+from support import TempDirTestCase
+
+from bmi_core.bmi import calculate_bmi, categorize_bmi
+from bmi_core.score import score_files
+
+
+def scored(weight, height):
+    bmi = calculate_bmi(weight, height)
+    return round(bmi, 2), categorize_bmi(bmi)[0]
+
+
+class ScoreFilesTest(TempDirTestCase):
+
+    def write(self, name, text):
+        path = os.path.join(self.workdir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def score(self, paths, **kwargs):
+        out = io.StringIO()
+        rejections = []
+        counts = score_files(paths, out, rejected=lambda *args: rejections.append(args), **kwargs)
+        return out.getvalue(), counts, rejections
+
+    def test_csv_round_trip_keeps_extra_columns(self):
+        path = self.write("in.csv", "name,weight,height\nann,70,175\nbo,95.5,180\n")
+        text, counts, rejections = self.score([path])
+        self.assertEqual(counts, (2, 0))
+        self.assertEqual(rejections, [])
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual(list(rows[0]), ["name", "weight", "height", "bmi", "category"])
+        self.assertEqual([(row['name'], float(row['bmi']), row['category']) for row in rows],
+                         [("ann", *scored(70, 175)), ("bo", *scored(95.5, 180))])
+
+    def test_jsonl_output(self):
+        path = self.write("in.jsonl", '{"weight": 70, "height": 175, "note": "x"}\n\n'
+                                      '{"weight": 50, "height": 170}\n')
+        text, counts, _ = self.score([path], output_format="jsonl")
+        self.assertEqual(counts, (2, 0))
+        records = [json.loads(line) for line in text.splitlines()]
+        bmi, category = scored(70, 175)
+        self.assertEqual(records[0], {"weight": 70.0, "height": 175.0, "note": "x",
+                                      "bmi": bmi, "category": category})
+        self.assertEqual((records[1]['bmi'], records[1]['category']), scored(50, 170))
+
+    def test_rejected_rows_are_reported_with_their_line(self):
+        csv_path = self.write("in.csv", "weight,height\n70,175\nheavy,175\n70,0\n")
+        jsonl_path = self.write("in.jsonl", 'not json\n{"weight": 70, "height": 175}\n')
+        text, counts, rejections = self.score([csv_path, jsonl_path])
+        self.assertEqual(counts, (2, 3))
+        self.assertEqual(rejections, [
+            (csv_path, 3, "Please enter a valid weight"),
+            (csv_path, 4, "Height must be between 0 and 300 cm"),
+            (jsonl_path, 1, "Malformed record"),
+        ])
+        self.assertEqual(len(text.splitlines()), 3)
+
+    def test_workers_keep_the_input_order(self):
+        lines = [f"{i},{50 + i % 60},{150 + i % 40}" for i in range(200)]
+        path = self.write("in.csv", "id,weight,height\n" + "\n".join(lines) + "\n")
+        serial, serial_counts, _ = self.score([path], chunk_size=7)
+        parallel, parallel_counts, _ = self.score([path], chunk_size=7, workers=3)
+        self.assertEqual(parallel_counts, (200, 0))
+        self.assertEqual(parallel, serial)
+        ids = [row['id'] for row in csv.DictReader(io.StringIO(parallel))]
+        self.assertEqual(ids, [str(i) for i in range(200)])
+
+
+if __name__ == "__main__":
+    unittest.main()
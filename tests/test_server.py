@@ -0,0 +1,81 @@
+"""Requests the HTTP server must reject cleanly, however malformed they are
+
+Run with: python -m unittest discover tests
+"""
+import asyncio
+import unittest
+
+from support import TempDirTestCase, make_entry
+
+from bmi_core.server import BMIServer, HTTPError
+from bmi_core.storage import JSONStore
+
+
+class OversizedRequestTest(TempDirTestCase, unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        store = JSONStore(self.path)
+        store.load()
+        self.server = BMIServer(store, workers=1)
+        self.listener = await asyncio.start_server(self.server.serve_connection, '127.0.0.1', 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+        self.server.close()
+
+    async def request(self, data):
+        """Send raw bytes and return the status line and whether the server closes the connection"""
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        writer.write(data)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        head = response.split(b"\r\n\r\n", 1)[0].decode()
+        return head.split("\r\n")[0], "Connection: close" in head
+
+    async def test_long_header_line(self):
+        data = b"GET /users HTTP/1.1\r\nX-Big: " + b"a" * 70_000 + b"\r\n\r\n"
+        self.assertEqual(await self.request(data),
+                         ("HTTP/1.1 431 Request Header Fields Too Large", True))
+
+    async def test_long_request_line(self):
+        data = b"GET /" + b"a" * 70_000 + b" HTTP/1.1\r\n\r\n"
+        self.assertEqual(await self.request(data), ("HTTP/1.1 400 Bad Request", True))
+
+    async def test_too_many_headers(self):
+        data = (b"GET /users HTTP/1.1\r\n"
+                + b"".join(b"X-%d: 1\r\n" % i for i in range(200)) + b"\r\n")
+        self.assertEqual(await self.request(data),
+                         ("HTTP/1.1 431 Request Header Fields Too Large", True))
+
+
+class RollupQueryTest(TempDirTestCase, unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        store = JSONStore(self.path)
+        store.load()
+        store.append("alice", make_entry(0))
+        self.server = BMIServer(store, workers=1)
+
+    async def asyncTearDown(self):
+        self.server.close()
+
+    async def test_malformed_dates_are_rejected_for_every_granularity(self):
+        for granularity in ("daily", "weekly", "monthly"):
+            for query in ({'start': ['bad']}, {'end': ['2024-1-5']}):
+                query = dict(query, granularity=[granularity])
+                with self.subTest(query=query):
+                    with self.assertRaises(HTTPError) as raised:
+                        await self.server.handle('GET', '/users/alice/rollups', query, None)
+                    self.assertEqual(raised.exception.status, 400)
+                    self.assertIn("YYYY-MM-DD", str(raised.exception))
+
+        query = {'granularity': ['weekly'], 'start': ['2017-07-01'], 'end': ['2017-07-31']}
+        (bucket,) = await self.server.handle('GET', '/users/alice/rollups', query, None)
+        self.assertEqual(bucket['count'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,340 @@
+"""Journal replay, crash recovery and read-only loading of the stores
+
+Run with: python -m unittest discover tests
+"""
+import io
+import json
+import os
+import unittest
+from unittest import mock
+
+from support import TempDirTestCase, make_entry
+
+from bmi_core.importer import import_files
+from bmi_core.storage import BinaryStore, JournalStore, JSONStore, SharedStore, SQLiteStore
+
+
+class StoreTestCase(TempDirTestCase):
+
+    def files(self, sqlite=False):
+        """Every file in the data directory with its contents
+
+        With `sqlite`, the -wal and -shm files SQLite may create to read a
+        database in WAL mode are left out.
+        """
+        contents = {}
+        for name in os.listdir(self.workdir):
+            if sqlite and name.endswith(("-wal", "-shm")):
+                continue
+            with open(os.path.join(self.workdir, name), 'rb') as f:
+                contents[name] = f.read()
+        return contents
+
+    def dates(self, store, username="alice"):
+        return [entry['date'] for entry in store.history(username)]
+
+
+class ReadOnlyLoadTest(StoreTestCase):
+
+    def check_untouched(self, store_class):
+        writer = store_class(self.path)
+        writer.load()
+        for i in range(3):
+            writer.append("alice", make_entry(i))
+        writer.commit()
+        before = self.files()
+
+        reader = store_class(self.path)
+        reader.load(readonly=True)
+        self.assertEqual(self.dates(reader), [make_entry(i)['date'] for i in range(3)])
+        self.assertEqual(self.files(), before)
+        with self.assertRaises(OSError):
+            reader.append("alice", make_entry(3))
+        self.assertEqual(len(reader.history("alice")), 3)
+        reader.close()
+
+        # The writer's journal was not replaced underneath it
+        writer.append("alice", make_entry(3))
+        writer.commit()
+        writer.close()
+        reloaded = store_class(self.path)
+        reloaded.load()
+        self.assertEqual(len(reloaded.history("alice")), 4)
+        reloaded.close()
+
+    def test_journal_store_is_left_untouched(self):
+        self.check_untouched(JournalStore)
+
+    def test_binary_store_is_left_untouched(self):
+        self.check_untouched(BinaryStore)
+
+    def test_shared_store_is_left_untouched(self):
+        self.check_untouched(SharedStore)
+
+    def test_sqlite_store_is_left_untouched(self):
+        writer = SQLiteStore(self.path)
+        writer.load()
+        for i in range(3):
+            writer.append("alice", make_entry(i))
+        writer.commit()
+        writer.close()
+        before = self.files(sqlite=True)
+
+        reader = SQLiteStore(self.path)
+        reader.load(readonly=True)
+        self.assertEqual(self.dates(reader), [make_entry(i)['date'] for i in range(3)])
+        # Neither is cached yet, so both are built from the history without being stored
+        self.assertEqual(reader.stats("alice").count, 3)
+        self.assertEqual(len(reader.rollups("alice", "daily")), 1)
+        with self.assertRaises(OSError):
+            reader.append("alice", make_entry(3))
+        reader.close()
+        self.assertEqual(self.files(sqlite=True), before)
+
+    def test_sqlite_store_reads_json_without_creating_a_database(self):
+        writer = JournalStore(self.path)
+        writer.load()
+        writer.append("alice", make_entry(0))
+        writer.compact()
+        writer.close()
+        before = self.files()
+
+        reader = SQLiteStore(self.path)
+        reader.load(readonly=True)
+        self.assertEqual(reader.users(), ["alice"])
+        self.assertEqual(self.dates(reader), [make_entry(0)['date']])
+        self.assertEqual(reader.stats("alice").count, 1)
+        reader.close()
+        self.assertEqual(self.files(), before)
+
+    def test_binary_store_reads_json_without_converting_it(self):
+        writer = JournalStore(self.path)
+        writer.load()
+        writer.append("alice", make_entry(0))
+        writer.compact()
+        writer.close()
+        os.remove(os.path.splitext(self.path)[0] + ".journal")
+        before = self.files()
+
+        reader = BinaryStore(self.path)
+        reader.load(readonly=True)
+        self.assertEqual(self.dates(reader), [make_entry(0)['date']])
+        reader.close()
+        self.assertEqual(self.files(), before)
+
+
+class CrashRecoveryTest(StoreTestCase):
+
+    def write_journal(self, count=3):
+        store = JournalStore(self.path)
+        store.load()
+        for i in range(count):
+            store.append("alice", make_entry(i))
+        store.commit()
+        store.close()
+        with open(store.journal_path, 'rb') as f:
+            return store.journal_path, f.read().splitlines(keepends=True)
+
+    def test_torn_last_line_is_cut_off(self):
+        journal_path, lines = self.write_journal()
+        with open(journal_path, 'wb') as f:
+            f.write(b"".join(lines[:-1]) + lines[-1][:20])
+
+        store = JournalStore(self.path, compact_every=10)
+        store.load()
+        self.assertEqual(self.dates(store), [make_entry(i)['date'] for i in range(2)])
+        store.append("alice", make_entry(3))
+        store.commit()
+        store.close()
+
+        reloaded = JournalStore(self.path)
+        reloaded.load()
+        self.assertEqual(self.dates(reloaded), [make_entry(i)['date'] for i in (0, 1, 3)])
+        reloaded.close()
+
+    def test_unreadable_line_keeps_the_records_after_it(self):
+        journal_path, lines = self.write_journal()
+        lines[2] = b'{"op": "append", garbage\n'
+        with open(journal_path, 'wb') as f:
+            f.write(b"".join(lines))
+
+        store = JournalStore(self.path)
+        with mock.patch("sys.stderr", io.StringIO()) as stderr:
+            store.load()
+        self.assertIn(":3: Skipped unreadable journal record", stderr.getvalue())
+        self.assertEqual(self.dates(store), [make_entry(i)['date'] for i in (0, 2)])
+        store.close()
+        with open(journal_path + ".corrupt", 'rb') as f:
+            self.assertEqual(f.read(), b"".join(lines))
+
+    def interrupted_commit(self, crash_on):
+        """Run a compacting commit whose journal swap fails at the os.replace onto `crash_on`"""
+        store = JournalStore(self.path, compact_every=2)
+        store.load()
+        store.append("alice", make_entry(0))
+        store.append("alice", make_entry(1))
+        finish = store.begin_commit()()
+        # Made while the snapshot was written, so it belongs in the new journal
+        store.append("alice", make_entry(2))
+        replace = os.replace
+
+        def crash(src, dst):
+            if dst == crash_on(store):
+                raise OSError("Simulated crash")
+            replace(src, dst)
+        with mock.patch("os.replace", crash), self.assertRaises(OSError):
+            finish()
+        store.close()
+
+        reloaded = JournalStore(self.path)
+        reloaded.load()
+        self.assertEqual(self.dates(reloaded), [make_entry(i)['date'] for i in range(3)])
+        self.assertFalse(os.path.exists(reloaded.journal_path + ".next"))
+        reloaded.close()
+
+    def test_new_journal_is_swapped_in_after_the_snapshot(self):
+        self.interrupted_commit(lambda store: store.journal_path)
+
+    def test_new_journal_is_dropped_without_its_snapshot(self):
+        self.interrupted_commit(lambda store: store.path)
+
+
+class DateOrderTest(StoreTestCase):
+
+    def check_date_order(self, store_class):
+        store = store_class(self.path)
+        store.load()
+        # A recent entry made in the window, then an unsorted export of older ones
+        store.append("alice", make_entry(90))
+        store.stats("alice")
+        store.rollups("alice", "daily")
+        csv_path = os.path.join(self.workdir, "export.csv")
+        with open(csv_path, 'w') as f:
+            f.write("username,date,weight,height\n")
+            for i in (40, 10, 70, 20):
+                entry = make_entry(i)
+                f.write(f"alice,{entry['date']},{entry['weight']},175\n")
+        import_files(store, [csv_path], batch_size=2)
+
+        expected = [make_entry(i) for i in (10, 20, 40, 70, 90)]
+        self.assertEqual(self.dates(store), [entry['date'] for entry in expected])
+        self.assertEqual([entry['date'] for entry in store.history_page("alice", 0, 2)],
+                         [expected[4]['date'], expected[3]['date']])
+        self.assertEqual([entry['date'] for entry in store.history_page("alice", 2, 2)],
+                         [expected[2]['date'], expected[1]['date']])
+        stats = store.stats("alice")
+        self.assertEqual(stats.count, 5)
+        self.assertEqual(stats.first_weight, expected[0]['weight'])
+        self.assertEqual(stats.weight_change, expected[-1]['weight'] - expected[0]['weight'])
+        self.assertEqual(stats.latest_bmi, expected[-1]['bmi'])
+        (_, bucket), = store.rollups("alice", "daily")
+        self.assertEqual((bucket.first_weight, bucket.last_weight),
+                         (expected[0]['weight'], expected[-1]['weight']))
+        store.close()
+
+    def test_journal_store_keeps_dates_in_order(self):
+        self.check_date_order(JournalStore)
+
+    def test_list_history_keeps_dates_in_order(self):
+        store = JSONStore(self.path)
+        store.load()
+        # The note does not fit the columns, so bob's history is a plain list
+        store.append("bob", dict(make_entry(20), note="after lunch"))
+        store.stats("bob")
+        store.append("bob", make_entry(30))
+        self.assertIsInstance(store.history("bob"), list)
+        self.assertIn("bob", store.user_stats)
+        store.append("bob", make_entry(10))
+        self.assertEqual(self.dates(store, "bob"), [make_entry(i)['date'] for i in (10, 20, 30)])
+        stats = store.stats("bob")
+        self.assertEqual((stats.first_weight, stats.last_weight),
+                         (make_entry(10)['weight'], make_entry(30)['weight']))
+        store.close()
+
+    def test_sqlite_store_keeps_dates_in_order(self):
+        self.check_date_order(SQLiteStore)
+
+
+class ImportTest(StoreTestCase):
+
+    def test_small_import_is_compacted_into_the_snapshot(self):
+        csv_path = os.path.join(self.workdir, "export.csv")
+        with open(csv_path, 'w') as f:
+            f.write("username,weight,height\nalice,70,175\nbob,80,180\n")
+        for store_class in (JournalStore, SharedStore):
+            with self.subTest(store=store_class.__name__):
+                store = store_class(self.path)
+                store.load()
+                self.assertEqual(import_files(store, [csv_path]), (2, 0))
+                store.close()
+                with open(self.path, 'r') as f:
+                    self.assertEqual(sorted(json.load(f)), ["alice", "bob"])
+                with open(store.journal_path, 'rb') as f:
+                    self.assertEqual(len(f.read().splitlines()), 1)
+
+
+class SharedSyncTest(StoreTestCase):
+
+    def test_sync_after_another_instance_compacts_bumps_versions(self):
+        first = SharedStore(self.path, compact_every=4)
+        first.load()
+        first.append("alice", make_entry(0))
+        first.commit()
+        second = SharedStore(self.path)
+        second.load()
+        version = second.version("alice")
+
+        # The fourth record compacts the journal into a new snapshot
+        for i in range(1, 4):
+            first.append("alice", make_entry(i))
+        first.commit()
+        first.close()
+
+        self.assertEqual(second.sync(), {"alice"})
+        self.assertEqual(len(second.history("alice")), 4)
+        self.assertGreater(second.version("alice"), version)
+        second.close()
+
+
+class PurgeTest(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = JSONStore(self.path)
+        self.store.load()
+        self.ids = [self.store.append("alice", make_entry(i)) for i in range(100)]
+
+    def delete(self, indexes):
+        for i in indexes:
+            self.store.delete("alice", self.ids[i])
+        return [make_entry(i)['date'] for i in range(100) if i not in indexes]
+
+    def test_tombstones_are_kept_below_the_threshold(self):
+        expected = self.delete({3, 50, 97})
+        self.store.purge("alice")
+        history = self.store.history("alice")
+        self.assertEqual(history.removed, 3)
+        self.assertEqual([entry['date'] for entry in history[10:60]], expected[10:60])
+        self.assertEqual([entry['date'] for entry in self.store.history_page("alice", 5, 20)],
+                         expected[::-1][5:25])
+        self.assertEqual(history[-1]['date'], expected[-1])
+
+    def test_purge_compacts_and_keeps_deleting_by_id(self):
+        expected = self.delete(set(range(0, 100, 3)))
+        self.store.purge("alice")
+        self.assertEqual(self.store.history("alice").removed, 0)
+        self.assertEqual(self.dates(self.store), expected)
+        self.store.delete("alice", self.ids[1])
+        self.assertEqual(self.dates(self.store), expected[1:])
+
+    def test_changes_while_compacting_are_not_overwritten(self):
+        self.delete(set(range(0, 100, 3)))
+        build = self.store.begin_purge("alice")
+        finish = build()
+        self.store.delete("alice", self.ids[1])
+        finish()
+        self.assertNotIn(make_entry(1)['date'], self.dates(self.store))
+
+
+if __name__ == "__main__":
+    unittest.main()
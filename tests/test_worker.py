@@ -0,0 +1,157 @@
+"""Ordering and durability of background saves under bursts of changes
+
+Run with: python -m unittest discover tests
+"""
+import threading
+import time
+import unittest
+
+from support import TempDirTestCase, make_entry
+
+from bmi_core.storage import JournalStore, JSONStore
+from bmi_core.worker import BackgroundWorker, CoalescingWriter, LockedStore
+
+
+class SlowWrites:
+    """Make a store's snapshot writes slow and report when one is under way"""
+
+    def __init__(self, store, delay=0.2):
+        self.writing = threading.Event()
+        write_files = store._write_files
+
+        def slow_write_files(*args):
+            self.writing.set()
+            time.sleep(delay)
+            return write_files(*args)
+        store._write_files = slow_write_files
+
+
+class CoalescingWriterTest(unittest.TestCase):
+
+    def test_burst_is_coalesced_and_every_request_is_covered(self):
+        changes = [0]
+        committed = []
+
+        def commit():
+            seen = changes[0]
+            time.sleep(0.01)
+            committed.append(seen)
+
+        writer = CoalescingWriter(commit)
+        results = []
+        lock = threading.Lock()
+
+        def burst():
+            for _ in range(200):
+                with lock:
+                    changes[0] += 1
+                    made = changes[0]
+                # The commit answering this request must cover the change made before it
+                writer.request(lambda error, made=made: results.append((made, committed[-1], error)))
+
+        threads = [threading.Thread(target=burst) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.stop()
+
+        self.assertEqual(len(results), 800)
+        for made, covered, error in results:
+            self.assertIsNone(error)
+            self.assertGreaterEqual(covered, made)
+        self.assertEqual(committed, sorted(committed))
+        self.assertEqual(committed[-1], 800)
+        self.assertLess(writer.commits, 800)
+
+    def test_errors_reach_the_callbacks(self):
+        def commit():
+            raise OSError("disk full")
+
+        errors = []
+        writer = CoalescingWriter(commit)
+        writer.request(errors.append)
+        writer.stop()
+        self.assertIsInstance(errors[0], OSError)
+
+
+class BackgroundSaveTest(TempDirTestCase):
+
+    def burst(self, store, worker, writers=4, entries=150):
+        """Append from several threads, asking for a save after every entry"""
+        def write(n):
+            for i in range(entries):
+                store.append(f"user{n}", make_entry(n * entries + i))
+                worker.save()
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        worker.close()
+        store.close()
+
+    def check(self, store_class, writers=4, entries=150):
+        store = store_class(self.path)
+        store.load()
+        for n in range(writers):
+            dates = [entry['date'] for entry in store.history(f"user{n}")]
+            expected = [make_entry(n * entries + i)['date'] for i in range(entries)]
+            self.assertEqual(dates, expected)
+        store.close()
+
+    def test_journal_burst_keeps_every_entry_in_order(self):
+        store = LockedStore(JournalStore(self.path, compact_every=100))
+        store.load()
+        self.burst(store, BackgroundWorker(store))
+        self.check(JournalStore)
+
+    def test_json_burst_keeps_every_entry_in_order(self):
+        store = LockedStore(JSONStore(self.path))
+        store.load()
+        self.burst(store, BackgroundWorker(store))
+        self.check(JSONStore)
+
+    def test_changes_during_a_compaction_survive(self):
+        inner = JournalStore(self.path, compact_every=10)
+        slow = SlowWrites(inner)
+        store = LockedStore(inner)
+        store.load()
+        for i in range(10):
+            store.append("alice", make_entry(i))
+
+        commit = threading.Thread(target=store.commit)
+        commit.start()
+        self.assertTrue(slow.writing.wait(5))
+        for i in range(10, 15):
+            store.append("alice", make_entry(i))
+        commit.join()
+        store.commit()
+        store.close()
+
+        reloaded = JournalStore(self.path)
+        reloaded.load()
+        self.assertEqual(len(reloaded.history("alice")), 15)
+        reloaded.close()
+
+    def test_commit_does_not_hold_the_store_lock_while_writing(self):
+        inner = JSONStore(self.path)
+        slow = SlowWrites(inner, delay=0.5)
+        store = LockedStore(inner)
+        store.load()
+        store.append("alice", make_entry(0))
+
+        commit = threading.Thread(target=store.commit)
+        commit.start()
+        self.assertTrue(slow.writing.wait(5))
+        start = time.perf_counter()
+        store.append("alice", make_entry(1))
+        store.users()
+        waited = time.perf_counter() - start
+        commit.join()
+        self.assertLess(waited, 0.25)
+
+
+if __name__ == "__main__":
+    unittest.main()